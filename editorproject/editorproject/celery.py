@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import celeryd_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'editorproject.settings')
 
@@ -8,4 +9,28 @@ app = Celery('editorproject')
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@celeryd_init.connect
+def advertise_render_capacity(sender=None, conf=None, options=None, **kwargs):
+    """
+    Logs how many concurrent 4K / 1080p renders fit in VIDEO_WORKER_MEMORY_BUDGET_MB and,
+    unless a concurrency was configured explicitly, sizes the worker pool to match.
+    The resulting concurrency is what encoding.render_threads() divides the cores by.
+    """
+    from django.conf import settings
+    from imageditor.streaming import renders_fit_in_budget
+
+    capacity_4k = renders_fit_in_budget(width=3840, height=2160)
+    capacity_1080p = renders_fit_in_budget(width=1920, height=1080)
+    print(f"[Video Worker] {sender}: {settings.VIDEO_WORKER_MEMORY_BUDGET_MB} MB budget fits "
+          f"{capacity_4k} concurrent 4K renders ({capacity_1080p} at 1080p)")
+
+    if conf is None:
+        return
+    if options and options.get('concurrency'):
+        # `celery worker -c N` wins; record it so render threads are budgeted against it
+        conf.worker_concurrency = options['concurrency']
+    elif not getattr(settings, 'CELERY_WORKER_CONCURRENCY', None):
+        conf.worker_concurrency = min(capacity_4k, os.cpu_count() or 1)
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,7 +51,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.gzip.GZipMiddleware',  # Compress responses for faster transfers
+    'imageditor.middleware.StreamingAwareGZipMiddleware',  # Compress responses for faster transfers (skips SSE streams)
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -76,6 +77,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'editorproject.wsgi.application'
+# Streaming task events need an ASGI server: run uvicorn against editorproject/asgi.py (see README)
 
 
 # Database
@@ -138,6 +140,107 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TASK_TRACK_STARTED = True  # Report STARTED so in-flight jobs can be told apart from unknown ones
+
+# Interactive previews, commit renders and long/batch jobs get their own queues, so a long
+# export never sits in front of a preview. A worker started without -Q consumes all three;
+# dedicated workers (see README) keep cores reserved for interactive latency.
+# The editor UI only requests preview renders (commit copies the preview), so video_commit
+# only sees renders requested through the API with profile=commit; video_batch also takes
+# unrouted tasks (profile uploads, media GC).
+CELERY_TASK_QUEUES = (
+    Queue('video_preview', routing_key='video_preview'),
+    Queue('video_commit', routing_key='video_commit'),
+    Queue('video_batch', routing_key='video_batch'),
+)
+CELERY_TASK_DEFAULT_QUEUE = 'video_batch'
+CELERY_TASK_ROUTES = {
+    'imageditor.tasks.process_video_task': {'queue': 'video_preview'},
+}
+# Priorities within a queue (Redis broker: 0 is the highest)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+# Renders are long; don't let a busy worker process reserve queued previews ahead of time
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Where video renders are dispatched, per encoding profile (see imageditor/encoding.py);
+# the profile comes from preview_video's optional `profile` POST field
+VIDEO_PROFILE_ROUTES = {
+    'preview': {'queue': 'video_preview', 'priority': 0},
+    'commit': {'queue': 'video_commit', 'priority': 3},
+    'export': {'queue': 'video_batch', 'priority': 6},
+}
+
+# Identical video jobs are deduplicated while in flight; the Redis lock expires after this many seconds
+VIDEO_JOB_LOCK_TTL = int(os.getenv('VIDEO_JOB_LOCK_TTL', 15 * 60))
+
+# Streaming renders hold at most READ_AHEAD + WRITE_BEHIND + 2 decoded frames in memory
+VIDEO_STREAM_READ_AHEAD = int(os.getenv('VIDEO_STREAM_READ_AHEAD', 4))
+VIDEO_STREAM_WRITE_BEHIND = int(os.getenv('VIDEO_STREAM_WRITE_BEHIND', 4))
+# Preview renders are also written as a live HLS stream of short segments, so playback
+# starts as soon as the first segment is encoded instead of when the whole file is done
+VIDEO_PREVIEW_STREAMING = os.getenv('VIDEO_PREVIEW_STREAMING', 'True') == 'True'
+VIDEO_STREAM_SEGMENT_SECONDS = int(os.getenv('VIDEO_STREAM_SEGMENT_SECONDS', 1))
+# Memory a Celery worker may spend on renders; used to advertise/default its concurrency
+VIDEO_WORKER_MEMORY_BUDGET_MB = int(os.getenv('VIDEO_WORKER_MEMORY_BUDGET_MB', 4096))
+
+# Resumable chunked video uploads: largest accepted file, and how long an unfinished upload can be resumed
+VIDEO_UPLOAD_MAX_BYTES = int(os.getenv('VIDEO_UPLOAD_MAX_BYTES', 5 * 1024 ** 3))
+VIDEO_UPLOAD_TTL = int(os.getenv('VIDEO_UPLOAD_TTL', 24 * 60 * 60))
+
+# Rendered video previews are cached under MEDIA_ROOT/render_cache (LRU-evicted past this size)
+VIDEO_RENDER_CACHE_MAX_BYTES = int(os.getenv('VIDEO_RENDER_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Temporary media (sessions, overlays, AI images, stored uploads) is deleted once unused for
+# MEDIA_TTL_SECONDS, and least recently used first while it exceeds MEDIA_DISK_BUDGET_BYTES;
+# files used in the last MEDIA_GC_MIN_AGE_SECONDS are never evicted (see imageditor/media_gc.py)
+MEDIA_TTL_SECONDS = int(os.getenv('MEDIA_TTL_SECONDS', 24 * 60 * 60))
+MEDIA_DISK_BUDGET_BYTES = int(os.getenv('MEDIA_DISK_BUDGET_BYTES', 20 * 1024 ** 3))
+MEDIA_GC_MIN_AGE_SECONDS = int(os.getenv('MEDIA_GC_MIN_AGE_SECONDS', 30 * 60))
+MEDIA_GC_INTERVAL_SECONDS = int(os.getenv('MEDIA_GC_INTERVAL_SECONDS', 10 * 60))
+
+# Per-user limits on temporary media; a new upload evicts the user's least recently used sessions to fit
+MEDIA_USER_QUOTA_BYTES = int(os.getenv('MEDIA_USER_QUOTA_BYTES', 6 * 1024 ** 3))
+MEDIA_USER_MAX_SESSIONS = int(os.getenv('MEDIA_USER_MAX_SESSIONS', 5))
+
+# "Save to profile" uploads: Cloudinary chunk size, and retries (exponential backoff between
+# PROFILE_UPLOAD_RETRY_BACKOFF and PROFILE_UPLOAD_RETRY_BACKOFF_MAX seconds) on network/server errors
+PROFILE_UPLOAD_CHUNK_SIZE = int(os.getenv('PROFILE_UPLOAD_CHUNK_SIZE', 20 * 1024 ** 2))
+PROFILE_UPLOAD_MAX_RETRIES = int(os.getenv('PROFILE_UPLOAD_MAX_RETRIES', 8))
+PROFILE_UPLOAD_RETRY_BACKOFF = int(os.getenv('PROFILE_UPLOAD_RETRY_BACKOFF', 5))
+PROFILE_UPLOAD_RETRY_BACKOFF_MAX = int(os.getenv('PROFILE_UPLOAD_RETRY_BACKOFF_MAX', 10 * 60))
+
+# Where session media (working/preview files, thumbnails, overlays) lives: 'local' (MEDIA_ROOT,
+# shared by web and workers) or 'http' (an object store at SESSION_MEDIA_STORE_URL, read through
+# a per-node cache of up to SESSION_MEDIA_CACHE_MAX_BYTES); see imageditor/media_storage.py
+SESSION_MEDIA_STORAGE = os.getenv('SESSION_MEDIA_STORAGE', 'local')
+SESSION_MEDIA_STORE_URL = os.getenv('SESSION_MEDIA_STORE_URL', '')
+SESSION_MEDIA_STORE_TOKEN = os.getenv('SESSION_MEDIA_STORE_TOKEN')
+SESSION_MEDIA_CACHE_DIR = os.getenv('SESSION_MEDIA_CACHE_DIR', os.path.join(MEDIA_ROOT, 'media_cache'))
+SESSION_MEDIA_CACHE_MAX_BYTES = int(os.getenv('SESSION_MEDIA_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+
+# Downloads are checked by Django but can be sent by the front-end server: '' (Django streams
+# the file), 'x-accel-redirect' (nginx, via the internal location MEDIA_DOWNLOAD_ACCEL_PREFIX)
+# or 'x-sendfile' (Apache mod_xsendfile / lighttpd; local media storage only, files from an
+# HTTP media storage are streamed by Django)
+MEDIA_DOWNLOAD_OFFLOAD = os.getenv('MEDIA_DOWNLOAD_OFFLOAD', '').lower()
+MEDIA_DOWNLOAD_ACCEL_PREFIX = os.getenv('MEDIA_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
+# Committed edits get signed, content-versioned URLs that browsers and CDNs may cache this
+# long without revalidating (see imageditor/media_versions.py); capped at MEDIA_TTL_SECONDS,
+# after which the GC may delete a version nobody fetched
+MEDIA_VERSION_MAX_AGE = int(os.getenv('MEDIA_VERSION_MAX_AGE', MEDIA_TTL_SECONDS))
+
+CELERY_BEAT_SCHEDULE = {
+    'collect-temp-media': {
+        'task': 'imageditor.tasks.collect_temp_media',
+        'schedule': MEDIA_GC_INTERVAL_SECONDS,
+        'options': {'queue': 'video_batch'},
+    },
+}
 
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
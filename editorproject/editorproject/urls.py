@@ -1,10 +1,12 @@
+import re
+
 from django.contrib import admin
-from django.urls import path
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from django.urls import path, re_path
 
 from imageditor import views as editor_views
 
 from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -22,12 +24,19 @@ urlpatterns = [
     path('api/download/', editor_views.download_image, name='download_image'),
     path('api/preview-video/', editor_views.preview_video, name='preview_video'),
     path('api/task-status/<str:task_id>/', editor_views.check_task_status, name='check_task_status'),
+    path('api/task-events/<str:task_id>/', editor_views.task_events, name='task_events'),
+    path('api/cancel-task/<str:task_id>/', editor_views.cancel_task, name='cancel_task'),
     path('api/initial-video-upload/', editor_views.initial_video_upload, name='initial_video_upload'),
+    path('api/video-upload/start/', editor_views.start_video_upload, name='start_video_upload'),
+    path('api/video-upload/<str:upload_id>/', editor_views.video_upload_chunk, name='video_upload_chunk'),
+    path('api/video-upload/<str:upload_id>/finalize/', editor_views.finalize_video_upload, name='finalize_video_upload'),
     path('api/download-video/', editor_views.download_video, name='download_video'),
     path('api/process-video/', editor_views.process_video, name='process_video'), # Fixes the NoReverseMatch
     path('api/reset-video/', editor_views.reset_video_state, name='reset_video_state'), # Fixes the NoReverseMatch
     path('api/generate-ai-image/', editor_views.generate_ai_image, name='generate_ai_image'),
     path('api/save-to-profile/', editor_views.save_to_profile, name='save_to_profile'),
+    re_path(r'^media-versions/(?P<signature>[\w-]+)/(?P<name>[0-9a-f]{2}/[0-9a-f]{64}\.\w+)$',
+            editor_views.media_version, name='media_version'),
 
     path("register/", editor_views.register, name="register"),
     path("login/", editor_views.login_request, name="login"),
@@ -38,4 +47,9 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Like django.conf.urls.static.static(), plus Range requests for seeking in videos
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), editor_views.serve_media),
+    ]
+    # runserver serves static files by itself; uvicorn (see asgi.py) needs these
+    urlpatterns += staticfiles_urlpatterns()
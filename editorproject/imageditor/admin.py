@@ -4,7 +4,7 @@ from django.contrib.auth.models import User
 from django.db.models import Count, Q
 from django.utils.html import mark_safe
 
-from .models import UserEdit
+from .models import MediaSession, UserEdit
 
 # Unregister the original User admin so we can register our custom one
 admin.site.unregister(User)
@@ -62,3 +62,10 @@ class UserEditAdmin(admin.ModelAdmin):
     list_display = ('user', 'media_type', 'created_at', 'edited_file')
     list_filter = ('media_type', 'created_at')
     search_fields = ('user__username',)
+
+
+@admin.register(MediaSession)
+class MediaSessionAdmin(admin.ModelAdmin):
+    list_display = ('session_id', 'owner_key', 'media_type', 'bytes', 'created_at', 'last_access')
+    list_filter = ('media_type',)
+    search_fields = ('owner_key', 'user__username')
@@ -0,0 +1,100 @@
+"""
+Content-addressed store for uploaded originals.
+
+Uploads are hashed (SHA-256) while they are written and kept once per content under
+MEDIA_ROOT/blobs/<aa>/<bb>/<digest>.<ext>. A session's original/working/preview files
+are clones (reflink/hardlink, see storage_utils) of the blob, so uploading the same
+file again costs one hash and a few links. Everything derived from the content (the
+thumbnail sprite next to the blob, the render cache keyed by content hash) is reused
+by the repeat upload as well.
+
+Blobs are never modified: session files that get edited are replaced, not rewritten.
+A blob whose bytes differ from the upload it is named after (e.g. faststart-remuxed)
+has its own SHA-256 stored next to it in <digest>.sha256.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import default_storage
+
+from . import render_cache
+
+BLOB_DIR = 'blobs'
+
+
+def blob_path(digest, extension):
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+
+def digest_path(path):
+    """Where the SHA-256 of a rewritten blob's content is kept."""
+    return f"{os.path.splitext(path)[0]}.sha256"
+
+
+def _stored_digest(path, name_digest):
+    try:
+        with open(default_storage.path(digest_path(path))) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return name_digest  # Stored as uploaded
+
+
+def _temp_full_path():
+    temp_dir = default_storage.path(os.path.join(BLOB_DIR, 'incoming'))
+    os.makedirs(temp_dir, exist_ok=True)
+    return os.path.join(temp_dir, f"{uuid.uuid4().hex}.partial")
+
+
+def store_upload(uploaded_file, extension, prepare=None):
+    """
+    Streams a Django UploadedFile into the store, hashing it on the way.
+    Returns (blob storage path, SHA-256 of the blob's content).
+    """
+    temp_full = _temp_full_path()
+    digest = hashlib.sha256()
+    try:
+        with open(temp_full, 'wb') as f:
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                f.write(chunk)
+        return adopt_file(temp_full, digest.hexdigest(), extension, prepare)
+    finally:
+        if os.path.exists(temp_full):
+            os.remove(temp_full)
+
+
+def adopt_file(full_path, digest, extension, prepare=None):
+    """
+    Moves a file whose SHA-256 is `digest` (hashed now when None) into the store,
+    or deletes it when that content is already stored. `prepare(full_path)` runs once
+    per new content before the file becomes a blob (e.g. a faststart remux) and
+    returns True when it rewrote the file.
+
+    Returns (blob storage path, SHA-256 of the blob's content).
+    """
+    if digest is None:
+        digest = render_cache.content_hash(full_path)
+
+    path = blob_path(digest, extension)
+    full_blob_path = default_storage.path(path)
+
+    if os.path.exists(full_blob_path):
+        os.remove(full_path)
+        # No utime: session files share the blob's inode, and their mtime is part of their
+        # ETag and hash memo keys. media_gc.touch records the blob's last use instead
+        print(f"[Blob Store] ♻️ Reusing stored upload {digest[:12]}")
+        return path, _stored_digest(path, digest)
+
+    os.makedirs(os.path.dirname(full_blob_path), exist_ok=True)
+    content_digest = digest
+    if prepare is not None and prepare(full_path):
+        # Hashed once per new content (the rewrite just went through the page cache),
+        # so repeat uploads and version URLs never hash the video again
+        content_digest = render_cache.content_hash(full_path)
+        with open(default_storage.path(digest_path(path)), 'w') as f:
+            f.write(content_digest)
+
+    os.replace(full_path, full_blob_path)
+    render_cache.remember_hash(full_blob_path, content_digest)
+    return path, content_digest
@@ -0,0 +1,103 @@
+import numpy as np
+from moviepy import VideoClip
+
+_IDENTITY = np.arange(256, dtype=np.float64)
+
+
+class ColorTransform:
+    """
+    Compiles per-pixel colour effects into lookup tables applied in one pass per frame.
+
+    MoviePy's MultiplyColor, LumContrast and BlackAndWhite each run a separate float
+    pass over every frame and allocate new arrays. Per-channel effects (intensity,
+    brightness, contrast, tint) only depend on the channel's own value, so any chain
+    of them folds into a single 3x256 uint8 table. Grayscale mixes channels; it is
+    folded into three weighted float tables, summed in BlackAndWhite's order so the
+    truncated luma is the same, plus a table applied to that luma. Effects can be
+    chained freely and still cost one pass:
+
+        ColorTransform().multiply(1.2).lum_contrast(0.1, 0.2).grayscale().apply(clip)
+    """
+
+    def __init__(self):
+        # Per-channel tables applied before the (optional) grayscale mix ...
+        self.pre_lut = np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+        # ... the grayscale weights folded with pre_lut, and tables applied to the luma
+        self.luma_tables = None
+        self.post_lut = None
+
+        self._frame_buffer = None
+        self._luma = None
+        self._scratch = None
+        self._luma_index = None
+
+    # --- Building ---
+
+    def multiply(self, factor):
+        """Same result as vfx.MultiplyColor(factor); factor is a scalar or [r, g, b]."""
+        factors = np.broadcast_to(np.asarray(factor, dtype=np.float64), (3,))
+        table = np.minimum(255, factors[:, np.newaxis] * _IDENTITY)
+        return self._add_channel_lut(np.maximum(table, 0).astype(np.uint8))
+
+    def lum_contrast(self, lum=0.0, contrast=0.0, contrast_threshold=127):
+        """Same result as vfx.LumContrast(lum, contrast, contrast_threshold)."""
+        corrected = _IDENTITY + lum + contrast * (_IDENTITY - float(contrast_threshold))
+        table = np.clip(corrected, 0, 255).astype(np.uint8)
+        return self._add_channel_lut(np.tile(table, (3, 1)))
+
+    def grayscale(self, weights=(1, 1, 1)):
+        """Same result as vfx.BlackAndWhite(RGB=weights) with preserve_luminosity."""
+        weights = np.asarray(weights, dtype=np.float64)
+        weights = weights / weights.sum()
+
+        if self.luma_tables is None:
+            # Exactly BlackAndWhite's products (float64 weight * uint8 value)
+            self.luma_tables = weights[:, np.newaxis] * self.pre_lut
+            self.post_lut = np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+        else:
+            # Already gray: the new luma only depends on the current one
+            luma = (weights[:, np.newaxis] * self.post_lut).sum(axis=0).astype(np.uint8)
+            self.post_lut = np.tile(luma, (3, 1))
+        return self
+
+    def _add_channel_lut(self, table):
+        rows = np.arange(3)[:, np.newaxis]
+        if self.luma_tables is None:
+            self.pre_lut = table[rows, self.pre_lut]
+        else:
+            self.post_lut = table[rows, self.post_lut]
+        return self
+
+    # --- Applying ---
+
+    def apply(self, video: VideoClip) -> VideoClip:
+        return video.image_transform(self.transform_frame)
+
+    def transform_frame(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Applies the compiled tables to an RGB uint8 frame. The returned array is a
+        buffer reused across calls, so it is only valid until the next frame.
+        """
+        if self._frame_buffer is None or self._frame_buffer.shape != frame.shape:
+            self._frame_buffer = np.empty(frame.shape, dtype=np.uint8)
+            self._luma = np.empty(frame.shape[:2], dtype=np.float64)
+            self._scratch = np.empty(frame.shape[:2], dtype=np.float64)
+            self._luma_index = np.empty(frame.shape[:2], dtype=np.uint8)
+        out = self._frame_buffer
+
+        if self.luma_tables is None:
+            for c in range(3):
+                np.take(self.pre_lut[c], frame[..., c], out=out[..., c], mode='clip')
+            return out
+
+        luma, scratch, luma_index = self._luma, self._scratch, self._luma_index
+        # (R*r + G*g) + B*b, then truncated to uint8, as BlackAndWhite computes it
+        np.take(self.luma_tables[0], frame[..., 0], out=luma, mode='clip')
+        for c in (1, 2):
+            np.take(self.luma_tables[c], frame[..., c], out=scratch, mode='clip')
+            luma += scratch
+        np.copyto(luma_index, luma, casting='unsafe')
+
+        for c in range(3):
+            np.take(self.post_lut[c], luma_index, out=out[..., c], mode='clip')
+        return out
@@ -0,0 +1,84 @@
+import numpy as np
+from moviepy import VideoClip
+
+
+class StaticOverlayCompositor:
+    """
+    Blends a fixed RGBA overlay (text, logo) into every frame of a video.
+
+    Unlike CompositeVideoClip, which re-runs generic mask blending over the whole
+    frame for every frame, the premultiplied colour and inverse alpha of the
+    overlay's bounding box are computed once. Each frame then only blends that
+    sub-rectangle, in integer arithmetic, using preallocated buffers.
+    """
+
+    def __init__(self, overlay: np.ndarray, frame_size, position=(0, 0), opacity: float = 1.0):
+        """
+        :param overlay: HxWx4 uint8 RGBA array (straight, not premultiplied alpha)
+        :param frame_size: (width, height) of the video frames
+        :param position: (x, y) of the overlay's top-left corner in the frame
+        :param opacity: extra opacity multiplier in [0, 1]
+        """
+        frame_w, frame_h = frame_size
+        x, y = int(position[0]), int(position[1])
+
+        # Clip the overlay to the frame
+        src_x0, src_y0 = max(0, -x), max(0, -y)
+        src_x1 = min(overlay.shape[1], frame_w - x)
+        src_y1 = min(overlay.shape[0], frame_h - y)
+        overlay = overlay[src_y0:src_y1, src_x0:src_x1] if src_x1 > src_x0 and src_y1 > src_y0 else overlay[:0, :0]
+        x, y = max(0, x), max(0, y)
+
+        alpha = overlay[..., 3].astype(np.float32) * max(0.0, min(1.0, float(opacity)))
+        alpha = np.rint(alpha).astype(np.uint16)
+
+        # Shrink to the bounding box of visible pixels
+        rows = np.flatnonzero(alpha.any(axis=1))
+        cols = np.flatnonzero(alpha.any(axis=0))
+        if rows.size == 0:
+            self.region = None
+            return
+
+        r0, r1 = rows[0], rows[-1] + 1
+        c0, c1 = cols[0], cols[-1] + 1
+        alpha = alpha[r0:r1, c0:c1, np.newaxis]
+        rgb = overlay[r0:r1, c0:c1, :3].astype(np.uint16)
+
+        self.region = (slice(y + r0, y + r1), slice(x + c0, x + c1))
+        # out = (frame * (255 - a) + rgb * a) / 255, with rgb * a precomputed
+        self.premultiplied = rgb * alpha
+        self.inverse_alpha = np.uint16(255) - alpha
+
+        self._frame_buffer = None
+        self._work = np.empty(self.premultiplied.shape, dtype=np.uint16)
+        self._scratch = np.empty(self.premultiplied.shape, dtype=np.uint16)
+
+    def apply(self, video: VideoClip) -> VideoClip:
+        if self.region is None:
+            return video
+        return video.image_transform(self.blend)
+
+    def blend(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Returns the frame with the overlay blended in. The returned array is a
+        buffer reused across calls, so it is only valid until the next frame.
+        """
+        # Decoder frames are read-only (and cached by the reader), so blend into our own buffer
+        if self._frame_buffer is None or self._frame_buffer.shape != frame.shape:
+            self._frame_buffer = np.empty(frame.shape, dtype=np.uint8)
+        out = self._frame_buffer
+        np.copyto(out, frame, casting='unsafe')
+
+        region = out[self.region][..., :3]
+        work, scratch = self._work, self._scratch
+
+        np.multiply(region, self.inverse_alpha, out=work)
+        work += self.premultiplied
+        # Exact rounded division by 255: (v + 128 + ((v + 128) >> 8)) >> 8
+        work += 128
+        np.right_shift(work, 8, out=scratch)
+        scratch += work
+        np.right_shift(scratch, 8, out=scratch)
+        np.copyto(region, scratch, casting='unsafe')
+
+        return out
@@ -494,11 +494,15 @@ class OverlayEditor(ImageEditor):
 
         # Load overlay image - resolve to full path if needed
         try:
-            # Check if it's a relative path, convert to absolute
-            from django.core.files.storage import default_storage
-            if default_storage.exists(overlay_path):
-                overlay_path = default_storage.path(overlay_path)
-            overlay = Image.open(overlay_path)
+            # Check if it's a media storage path, otherwise treat it as a local file
+            from ..media_storage import get_media_storage
+            storage = get_media_storage()
+            if storage.exists(overlay_path):
+                with storage.open(overlay_path) as f:
+                    overlay = Image.open(f)
+                    overlay.load()
+            else:
+                overlay = Image.open(overlay_path)
         except Exception as e:
             raise ValueError(f"Failed to load overlay image: {str(e)}")
 
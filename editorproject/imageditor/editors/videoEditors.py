@@ -2,11 +2,13 @@ import os
 import platform
 from typing import Any
 
-from django.core.files.storage import default_storage
-from moviepy import VideoFileClip, TextClip, CompositeVideoClip, ImageClip, vfx
+from moviepy import VideoFileClip, vfx
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
-from django.conf import settings
+from .color import ColorTransform
+from .compositing import StaticOverlayCompositor
+from ..media_storage import get_media_storage
+from ..streaming import remapped_frames
 
 
 def make_even(val):
@@ -33,6 +35,10 @@ class VideoCropEditor:
         return video.cropped(x1=x1, y1=y1, x2=safe_x2, y2=safe_y2)
 
 class VideoEditor:
+    # Editors that change the audio track or the timeline (speed, looping) set this to
+    # True; for all others the task muxes the original audio stream without re-encoding.
+    MODIFIES_AUDIO = False
+
     def edit(self, video: VideoFileClip, **options) -> VideoFileClip:
         raise NotImplementedError
 
@@ -102,6 +108,8 @@ class VideoLoopEditor:
     n: Number of times to loop (e.g., n=2 plays the video twice).
     duration: Loops until the video reaches a specific total duration.
     """
+    MODIFIES_AUDIO = True
+
     def edit(self, video: VideoFileClip, **options: Any) -> VideoFileClip:
         n_times = options.get("n")
         target_duration = options.get("duration")
@@ -111,10 +119,16 @@ class VideoLoopEditor:
         except AttributeError:
             return video.loop(n=n_times, duration=target_duration)
 
+    def frames(self, video: VideoFileClip, edited: VideoFileClip, fps: float, **options: Any):
+        # OPTIMIZATION: One forward pass per loop instead of seeking back to the start
+        return remapped_frames(video, fps, int(edited.duration * fps),
+                               lambda i: int(((i / fps) % video.duration) * fps + 0.00001))
+
 
 class VideoGrayscaleEditor:
     def edit(self, video: VideoFileClip, **options) -> VideoFileClip:
-        return vfx.BlackAndWhite().apply(video)
+        # OPTIMIZATION: Table-driven equivalent of vfx.BlackAndWhite()
+        return ColorTransform().grayscale().apply(video)
 
 
 class VideoColorEditor:
@@ -123,12 +137,11 @@ class VideoColorEditor:
         contrast = options.get("contrast", 0.0)
         brightness = options.get("brightness", 0.0)
 
-
-        video = vfx.MultiplyColor(factor=intensity).apply(video)
-
-        video = vfx.LumContrast(lum=brightness, contrast=contrast).apply(video)
-
-        return video
+        # OPTIMIZATION: MultiplyColor + LumContrast folded into one lookup table, one pass per frame
+        return (ColorTransform()
+                .multiply(intensity)
+                .lum_contrast(lum=brightness, contrast=contrast)
+                .apply(video))
 
 
 class VideoPaintingEditor:
@@ -142,7 +155,7 @@ class VideoTintEditor:
         g = options.get("g", 1.0)
         b = options.get("b", 1.0)
 
-        return vfx.MultiplyColor(factor=[r, g, b]).apply(video)
+        return ColorTransform().multiply([r, g, b]).apply(video)
 
 # Example Usage for a "Sepia/Warm" look:
 # tint_editor.edit(video, r=1.2, g=1.0, b=0.8)
@@ -152,6 +165,7 @@ class VideoSpeedEditor:
     """
     Adjusts the playback speed of the video.
     """
+    MODIFIES_AUDIO = True
 
     def edit(self, video: VideoFileClip, **options: Any) -> VideoFileClip:
         factor = float(options.get("factor", 1.0))
@@ -164,6 +178,12 @@ class VideoSpeedEditor:
         except AttributeError:
             return video.multiply_speed(factor)
 
+    def frames(self, video: VideoFileClip, edited: VideoFileClip, fps: float, **options: Any):
+        factor = float(options.get("factor", 1.0))
+        # OPTIMIZATION: One forward pass, repeating (slow motion) or skipping (fast) source frames
+        return remapped_frames(video, fps, int(edited.duration * fps),
+                               lambda i: int(i * factor + 0.00001))
+
 
 class VideoFadeEditor:
     def edit(self, video, **options):
@@ -237,12 +257,9 @@ class VideoWatermarkEditor:
             draw.text((text_x, current_y), line, font=font, fill=color, stroke_width=stroke_width, stroke_fill="black")
             current_y += line_height
 
-        watermark_array = np.array(overlay)
-        text_clip = (ImageClip(watermark_array)
-                     .with_duration(video.duration)
-                     .with_position((0, 0)))
-
-        return CompositeVideoClip([video, text_clip])
+        # OPTIMIZATION: Blend only the text's bounding box, precomputed once for all frames
+        compositor = StaticOverlayCompositor(np.array(overlay), (video.w, video.h))
+        return compositor.apply(video)
 
     def _load_font(self, font_name: str, style: str, size: int):
         """Replaced with the multi-candidate search logic from SubtitleEditor"""
@@ -262,7 +279,6 @@ class VideoWatermarkEditor:
             candidates.append(f"{font_name}.ttf")
 
         # System paths for deep search
-        import platform
         system_dirs = []
         if platform.system() == "Windows":
             system_dirs = [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts')]
@@ -337,40 +353,33 @@ class VideoImageWatermarkEditor:
         if not image_source:
             raise ValueError("Image Watermark requires a logo file.")
 
+        # Load the logo (through the media storage, so any worker can read it)
         try:
-            absolute_logo_path = default_storage.path(image_source)
-        except Exception:
-            absolute_logo_path = os.path.join(settings.MEDIA_ROOT, image_source)
-
-        if not os.path.exists(absolute_logo_path):
-            raise FileNotFoundError(f"Worker cannot find logo at: {absolute_logo_path}")
-
-        # Load the logo
-        logo = ImageClip(absolute_logo_path)
+            with get_media_storage().open(image_source) as f, Image.open(f) as img:
+                logo = img.convert('RGBA')
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Worker cannot find logo at: {image_source}")
 
         # 3. Handle Sizing and Positioning
         if box:
-            x1, y1, x2, y2 = box
+            x1, y1, x2, y2 = [int(v) for v in box]
             width = x2 - x1
             height = y2 - y1
 
-            logo = (logo
-                    .resized(width=width, height=height)
-                    .with_position((x1, y1)))
+            logo = logo.resize((max(1, width), max(1, height)), Image.LANCZOS)
+            position = (x1, y1)
         else:
             scale = float(options.get("scale", 1.0))
-            logo = (logo
-                    .resized(scale)
-                    .with_position(self._parse_position(position_preset)))
-
-        logo = (logo
-                .with_duration(video.duration)
-                .with_opacity(opacity))
+            if scale != 1.0:
+                logo = logo.resize((max(1, round(logo.width * scale)), max(1, round(logo.height * scale))), Image.LANCZOS)
+            position = self._parse_position(position_preset, logo.size, (video.w, video.h))
 
-        return CompositeVideoClip([video, logo])
+        # OPTIMIZATION: Same static-overlay compositor as the text watermark
+        compositor = StaticOverlayCompositor(np.array(logo), (video.w, video.h), position, opacity)
+        return compositor.apply(video)
 
-    def _parse_position(self, preset):
-        """Maps frontend button-group values to MoviePy position tuples."""
+    def _parse_position(self, preset, logo_size, frame_size):
+        """Maps frontend button-group values to the logo's top-left pixel position."""
         mapping = {
             "top-left": ("left", "top"),
             "top-right": ("right", "top"),
@@ -378,4 +387,9 @@ class VideoImageWatermarkEditor:
             "bottom-right": ("right", "bottom"),
             "center": ("center", "center"),
         }
-        return mapping.get(preset, ("right", "bottom"))
\ No newline at end of file
+        horizontal, vertical = mapping.get(preset, ("right", "bottom"))
+        (logo_w, logo_h), (frame_w, frame_h) = logo_size, frame_size
+
+        x = {"left": 0, "center": (frame_w - logo_w) // 2, "right": frame_w - logo_w}[horizontal]
+        y = {"top": 0, "center": (frame_h - logo_h) // 2, "bottom": frame_h - logo_h}[vertical]
+        return x, y
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Encoder settings for video renders.
+
+Each render is encoded with a profile matched to what the output is for:
+    preview - renders shown while editing: fastest encode, quick to scrub
+    commit  - near-lossless, for a render meant to become the working copy
+    export  - best compression for the quality, for a file meant for download
+
+The editor only requests preview renders, and committing an edit copies that preview
+into the working file. commit and export renders are requested through preview_video's
+`profile` field (routed per VIDEO_PROFILE_ROUTES).
+
+x264 threads are budgeted per render: the worker's cores are split between its
+concurrent Celery processes instead of every render spawning threads for all cores.
+"""
+import os
+
+from celery import current_app
+
+DEFAULT_PROFILE = "preview"
+
+# Shared by every profile, and part of the render cache key
+BASE_ENCODER_SETTINGS = {
+    "codec": "libx264",
+    "audio_codec": "aac",
+    "pixel_format": "yuv420p",
+}
+
+ENCODING_PROFILES = {
+    "preview": {"preset": "ultrafast", "crf": 23, "tune": "fastdecode"},
+    "commit": {"preset": "veryfast", "crf": 18, "tune": None},
+    "export": {"preset": "slow", "crf": 20, "tune": "film"},
+}
+
+
+def get_profile(name):
+    profile = ENCODING_PROFILES.get(name or DEFAULT_PROFILE)
+    if profile is None:
+        raise ValueError(f"Unknown encoding profile '{name}'. Available: {list(ENCODING_PROFILES.keys())}")
+    return profile
+
+
+def render_threads():
+    """Encoder threads per render: CPU cores divided by the worker's concurrency."""
+    cpus = os.cpu_count() or 1
+    concurrency = current_app.conf.worker_concurrency or cpus
+    return max(1, cpus // concurrency)
+
+
+def cache_settings(profile_name):
+    """
+    Everything about a profile that changes the encoded output. Thread counts are
+    left out so workers with different core counts share render cache entries.
+    """
+    return {**BASE_ENCODER_SETTINGS, **get_profile(profile_name)}
+
+
+def encoder_settings(profile_name):
+    """Keyword arguments for streaming.render_clip."""
+    profile = get_profile(profile_name)
+
+    ffmpeg_params = ["-crf", str(profile["crf"])]
+    if profile["tune"]:
+        ffmpeg_params += ["-tune", profile["tune"]]
+
+    return {
+        **BASE_ENCODER_SETTINGS,
+        "preset": profile["preset"],
+        "ffmpeg_params": ffmpeg_params,
+        "threads": render_threads(),
+    }
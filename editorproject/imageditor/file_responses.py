@@ -0,0 +1,145 @@
+"""
+File responses with HTTP caching validators and byte-range support.
+
+FileResponse always sends the whole file, so every seek in the <video> player and
+every resumed download starts over from byte 0. ranged_file_response honours
+Range (a single byte range) and If-Range with 206 Partial Content, and sends
+ETag / Last-Modified so conditional requests can be answered with 304.
+
+offloaded_file_response leaves sending the bytes to nginx (X-Accel-Redirect) or
+Apache/lighttpd (X-Sendfile) once Django has decided the request may have the file.
+"""
+import mimetypes
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(stat):
+    # Size + mtime identifies a version of a session file; both change on every rewrite
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) inclusive for a single "bytes=" range, None when the header
+    should be ignored (absent, malformed, last < first or several ranges), or False
+    when the range can't be satisfied (starts past the end).
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None  # Invalid range-spec (RFC 9110 14.1.1): ignored, the full body is sent
+    if start >= size:
+        return False
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag  # Strong comparison only
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _iter_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def ranged_file_response(request, full_path, content_type=None, download_name=None,
+                         cache_control='private, no-cache'):
+    """
+    Serves full_path with Accept-Ranges / ETag / Last-Modified, answering Range
+    requests with 206 and conditional requests with 304. When download_name is
+    given the file is sent as an attachment under that name.
+    """
+    stat = os.stat(full_path)
+    size = stat.st_size
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    if content_type is None:
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        # 304 Not Modified or 412 Precondition Failed
+        response = not_modified
+    else:
+        byte_range = None
+        if request.method == 'GET' and _if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.headers.get('Range'), size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is None:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            response['Content-Length'] = str(size)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_range(open(full_path, 'rb'), start, length), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    if download_name and response.status_code in (200, 206):
+        response['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
+
+
+def offloaded_file_response(header, target, content_type=None, download_name=None,
+                            cache_control='private, no-cache'):
+    """
+    An empty response telling the front-end server to send the file itself: header is
+    'X-Accel-Redirect' (nginx, target is an internal URI) or 'X-Sendfile' (Apache
+    mod_xsendfile, lighttpd; target is a filesystem path). The server then handles
+    Range and conditional requests, and the Django worker is free right away.
+    """
+    if content_type is None:
+        content_type = mimetypes.guess_type(target)[0] or 'application/octet-stream'
+    response = HttpResponse(content_type=content_type)
+    response[header] = target
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    if download_name:
+        response['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from imageditor import media_gc
+
+
+class Command(BaseCommand):
+    help = "Deletes temporary media unused for MEDIA_TTL_SECONDS and enforces MEDIA_DISK_BUDGET_BYTES."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, help="Seconds since last access (default: MEDIA_TTL_SECONDS)")
+        parser.add_argument('--max-bytes', type=int, help="Disk budget (default: MEDIA_DISK_BUDGET_BYTES)")
+        parser.add_argument('--reindex', action='store_true',
+                            help="First add media already on disk to the index (one directory scan)")
+
+    def handle(self, *args, **options):
+        if options['reindex']:
+            groups = media_gc.reindex()
+            self.stdout.write(f"Indexed {groups} media groups.")
+
+        deleted, freed = media_gc.collect(ttl=options['ttl'], max_bytes=options['max_bytes'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} media groups, freed {freed / 1024 ** 2:.1f} MB."))
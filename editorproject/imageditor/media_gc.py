@@ -0,0 +1,235 @@
+"""
+Garbage collection for temporary media (session files, overlays, AI images, blobs).
+
+Files are tracked in Redis instead of found by scanning directories. Files that live
+and die together form a group:
+
+    session:<id>   original/working/preview files of one editing session
+    blob:<digest>  a stored upload and the thumbnails built from it (see blob_store)
+    file:<path>    anything else (overlays, AI-generated images, committed versions)
+
+    media:gc:access        sorted set: group -> last access (unix time)
+    media:gc:bytes         hash: group -> bytes on disk at its last access
+    media:gc:files:<group> set of the group's storage paths
+
+Views touch() the files they use; for session files that also updates the session
+registry (media_sessions), which drops the sessions collected here. collect() (Celery
+beat / `manage.py collect_temp_media`) deletes groups not accessed for MEDIA_TTL_SECONDS,
+then the least recently used groups until the total fits in MEDIA_DISK_BUDGET_BYTES,
+sparing anything used in the last MEDIA_GC_MIN_AGE_SECONDS so active sessions are never
+evicted under them.
+"""
+import os
+import time
+
+import redis
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import media_sessions
+from .blob_store import BLOB_DIR
+from .media_storage import get_media_storage
+from .video_jobs import get_redis
+
+ACCESS_KEY = 'media:gc:access'
+BYTES_KEY = 'media:gc:bytes'
+FILES_PREFIX = 'media:gc:files:'
+
+SESSION_PREFIXES = ('original_', 'working_', 'preview_')
+BLOB_DERIVED_PREFIXES = ('thumbs_', 'poster_')
+# Directories reindex() seeds the index from (views.TEMP_IMAGE_DIR / TEMP_OVERLAY_DIR, the blob store
+# and media_versions.VERSION_DIR)
+MEDIA_DIRS = ('temp_edited_images', 'temp_overlays', BLOB_DIR, 'versions')
+
+COLLECT_BATCH = 100
+
+
+def group_for(path):
+    """The GC group a storage path belongs to."""
+    directory, filename = os.path.split(path)
+    stem = os.path.splitext(filename)[0]
+
+    if directory.split(os.sep, 1)[0] == BLOB_DIR:
+        for prefix in BLOB_DERIVED_PREFIXES:
+            if stem.startswith(prefix):
+                stem = stem[len(prefix):]
+        return f"blob:{stem}"
+
+    for prefix in SESSION_PREFIXES:
+        if stem.startswith(prefix):
+            # Session ids have no underscores; get_available_name may have appended "_<random>"
+            return f"session:{stem[len(prefix):].split('_', 1)[0]}"
+
+    return f"file:{path}"
+
+
+def disk_usage(paths):
+    """
+    Bytes used by these storage paths; hardlinked files are only counted once. Files that
+    aren't on local disk (session files in an HTTP media storage) are sized by the storage.
+    """
+    storage = get_media_storage()
+    inodes = {}
+    remote = 0
+    for path in paths:
+        try:
+            stat = os.stat(default_storage.path(path))
+        except OSError:
+            if not storage.is_local:
+                try:
+                    remote += storage.size(path)
+                except OSError:  # Includes requests' errors
+                    pass
+            continue
+        inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return sum(inodes.values()) + remote
+
+
+def _register(client, groups, at, keep_newer=False):
+    pipe = client.pipeline()
+    for group, paths in groups.items():
+        pipe.sadd(FILES_PREFIX + group, *paths)
+        pipe.zadd(ACCESS_KEY, {group: at}, gt=keep_newer)
+    pipe.execute()
+
+    sizes = {group: disk_usage(client.smembers(FILES_PREFIX + group)) for group in groups}
+    pipe = client.pipeline()
+    for group, size in sizes.items():
+        pipe.hset(BYTES_KEY, group, size)
+    pipe.execute()
+    return sizes
+
+
+def touch(*paths):
+    """Records the groups of these storage paths as used now (and the paths as theirs)."""
+    groups = {}
+    for path in paths:
+        if path:
+            groups.setdefault(group_for(path), set()).add(path)
+    if not groups:
+        return
+
+    try:
+        sizes = _register(get_redis(), groups, time.time())
+    except redis.RedisError as e:
+        print(f"[Media GC] ⚠️ Could not record media access: {e}")
+        sizes = {}
+
+    # Keep the session registry's last access / size in step (see media_sessions)
+    media_sessions.record_access({
+        group[len(media_sessions.SESSION_GROUP_PREFIX):]: sizes.get(group)
+        for group in groups if group.startswith(media_sessions.SESSION_GROUP_PREFIX)
+    })
+
+
+def forget(*paths):
+    """Drops the groups of these paths from the index (their files were deleted elsewhere)."""
+    try:
+        pipe = get_redis().pipeline()
+        for group in {group_for(path) for path in paths if path}:
+            pipe.delete(FILES_PREFIX + group)
+            pipe.hdel(BYTES_KEY, group)
+            pipe.zrem(ACCESS_KEY, group)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[Media GC] ⚠️ Could not update the media index: {e}")
+
+
+def _delete_group(client, group):
+    """Deletes a group's files and forgets it. Returns the bytes freed."""
+    storage = get_media_storage()
+    paths = client.smembers(FILES_PREFIX + group)
+    freed = disk_usage(paths)
+    for path in paths:
+        full_path = default_storage.path(path)
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[Media GC] ❌ Could not delete {path}: {e}")
+        if not storage.is_local:
+            # Session files live in the object store (blob paths just aren't found there)
+            try:
+                storage.delete(path)
+            except OSError as e:
+                print(f"[Media GC] ❌ Could not delete {path} from the media storage: {e}")
+
+    pipe = client.pipeline()
+    pipe.delete(FILES_PREFIX + group)
+    pipe.hdel(BYTES_KEY, group)
+    pipe.zrem(ACCESS_KEY, group)
+    pipe.execute()
+
+    if group.startswith(media_sessions.SESSION_GROUP_PREFIX):
+        media_sessions.forget([group[len(media_sessions.SESSION_GROUP_PREFIX):]])
+    return freed
+
+
+def collect(ttl=None, max_bytes=None, min_age=None):
+    """
+    Deletes expired groups, then the least recently used ones until the total is within
+    max_bytes. Returns (groups deleted, bytes freed).
+    """
+    if ttl is None:
+        ttl = settings.MEDIA_TTL_SECONDS
+    if max_bytes is None:
+        max_bytes = settings.MEDIA_DISK_BUDGET_BYTES
+    if min_age is None:
+        min_age = settings.MEDIA_GC_MIN_AGE_SECONDS
+
+    client = get_redis()
+    now = time.time()
+    deleted = freed = 0
+
+    # 1. TTL: everything not accessed since now - ttl
+    while True:
+        expired = client.zrangebyscore(ACCESS_KEY, '-inf', now - ttl, start=0, num=COLLECT_BATCH)
+        if not expired:
+            break
+        for group in expired:
+            freed += _delete_group(client, group)
+            deleted += 1
+
+    # 2. Disk budget: least recently used first, never anything used in the last min_age seconds
+    total = sum(int(size) for size in client.hvals(BYTES_KEY))
+    while total > max_bytes:
+        oldest = client.zrangebyscore(ACCESS_KEY, '-inf', now - min_age, start=0, num=COLLECT_BATCH)
+        if not oldest:
+            break
+        for group in oldest:
+            if total <= max_bytes:
+                break
+            # The total is made of recorded sizes, so subtract the recorded one
+            total -= int(client.hget(BYTES_KEY, group) or 0)
+            freed += _delete_group(client, group)
+            deleted += 1
+
+    if deleted:
+        print(f"[Media GC] 🗑️ Deleted {deleted} media groups, freed {freed / 1024 ** 2:.1f} MB")
+    return deleted, freed
+
+
+def reindex():
+    """
+    Adds files already on disk to the index, with their mtime as last access. Only needed
+    once for media that predates the index; afterwards the views keep it up to date.
+    """
+    groups = {}
+    for directory in MEDIA_DIRS:
+        root = default_storage.path(directory)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(('.partial', '.tmp')):
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                path = os.path.relpath(full_path, default_storage.path(''))
+                group = group_for(path)
+                paths, last_access = groups.get(group, (set(), 0))
+                paths.add(path)
+                groups[group] = (paths, max(last_access, os.path.getmtime(full_path)))
+
+    client = get_redis()
+    for group, (paths, last_access) in groups.items():
+        _register(client, {group: paths}, last_access, keep_newer=True)
+    return len(groups)
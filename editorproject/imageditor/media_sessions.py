@@ -0,0 +1,108 @@
+"""
+Session registry and per-user storage quotas.
+
+Every editing session (original/working/preview files, see views.generate_stable_file_paths)
+gets a MediaSession row with its owner, files, size on disk and last access. Before an
+upload is stored, make_room() checks the owner's quota (MEDIA_USER_QUOTA_BYTES across at
+most MEDIA_USER_MAX_SESSIONS sessions) and evicts the owner's least recently used sessions
+to fit the new one.
+
+The rows are kept current by media_gc.touch(), and sessions deleted by the TTL collector
+are removed from the registry, so both always describe the same files.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from . import media_gc
+from .media_storage import get_media_storage
+from .models import MediaSession
+
+SESSION_GROUP_PREFIX = 'session:'
+
+
+class QuotaExceeded(Exception):
+    """The upload can't fit in the owner's quota even after evicting their other sessions."""
+
+
+def owner_key(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if not request.session.session_key:
+        # Anonymous uploads are accounted to their browser session; make sure it has a cookie
+        request.session.save()
+        request.session.modified = True
+    return f"anon:{request.session.session_key}"
+
+
+def session_id_for(path):
+    """The session id of a session file path, or None for other media."""
+    group = media_gc.group_for(path)
+    return group[len(SESSION_GROUP_PREFIX):] if group.startswith(SESSION_GROUP_PREFIX) else None
+
+
+def evict(session):
+    """Deletes a session's files and its registry row."""
+    for path in session.files:
+        try:
+            get_media_storage().delete(path)
+        except OSError as e:
+            print(f"[Media Sessions] ❌ Could not delete {path}: {e}")
+    session.delete()
+    media_gc.forget(*session.files)
+    print(f"[Media Sessions] 🗑️ Evicted session {session.session_id} of {session.owner_key}")
+
+
+def make_room(request, incoming_bytes):
+    """
+    Evicts the owner's least recently used sessions until a new session of incoming_bytes
+    fits in their quota. Raises QuotaExceeded when it can't fit at all.
+    """
+    if incoming_bytes > settings.MEDIA_USER_QUOTA_BYTES:
+        raise QuotaExceeded(
+            f"Upload is larger than the {settings.MEDIA_USER_QUOTA_BYTES / 1024 ** 2:.0f} MB storage quota."
+        )
+
+    sessions = list(MediaSession.objects.filter(owner_key=owner_key(request)).order_by('last_access'))
+    count = len(sessions)
+    used = sum(session.bytes for session in sessions)
+
+    for session in sessions:
+        if count < settings.MEDIA_USER_MAX_SESSIONS and used + incoming_bytes <= settings.MEDIA_USER_QUOTA_BYTES:
+            break
+        evict(session)
+        count -= 1
+        used -= session.bytes
+
+
+def register(request, media_type, paths, reserved_bytes=0):
+    """
+    Records a new session made of `paths` (storage paths of one session). reserved_bytes
+    counts against the quota until the files reach that size (e.g. a chunked upload).
+    """
+    session_id = session_id_for(paths[0])
+    size = media_gc.disk_usage(paths)
+    MediaSession.objects.update_or_create(
+        session_id=session_id,
+        defaults={
+            'owner_key': owner_key(request),
+            'user': request.user if request.user.is_authenticated else None,
+            'media_type': media_type,
+            'files': sorted(set(paths)),
+            'bytes': max(size, reserved_bytes),
+            'last_access': timezone.now(),
+        },
+    )
+
+
+def record_access(session_sizes):
+    """Updates last access (and size, when known) of sessions: {session_id: bytes or None}."""
+    now = timezone.now()
+    for session_id, size in session_sizes.items():
+        fields = {'last_access': now}
+        if size is not None:
+            fields['bytes'] = size
+        MediaSession.objects.filter(session_id=session_id).update(**fields)
+
+
+def forget(session_ids):
+    MediaSession.objects.filter(session_id__in=session_ids).delete()
@@ -0,0 +1,330 @@
+"""
+Storage layer for session media (working/preview files, thumbnails, overlays, AI images).
+
+Code that reads or writes session media goes through get_media_storage() instead of
+calling default_storage.path(), so web processes and Celery workers don't need to share
+a filesystem. SESSION_MEDIA_STORAGE picks the backend:
+
+    local  (default)  MEDIA_ROOT, shared by web and workers; clones instead of copies
+    http              an HTTP object store (GET / PUT / HEAD / DELETE on
+                      SESSION_MEDIA_STORE_URL/<path>, e.g. nginx with WebDAV or an
+                      S3-compatible gateway) holds the files; every node keeps a
+                      read-through cache of the ones it uses
+
+Callers get handles rather than locations:
+
+    open(path)             readable, seekable binary file (PIL, hashing)
+    size(path)             bytes stored (quotas and the GC disk budget)
+    local_path(path)       context manager with a file on local disk, for ffmpeg/MoviePy
+    temp_path(path)        where to write a new version of `path` ...
+    save_from(temp, path)  ... which is then published atomically (moved or uploaded)
+
+Uploads, the blob store, the render cache and the GC index stay node-local; session
+files made from them are published with copy_in(). With the http backend MEDIA_URL should
+point at the store (or a CDN in front of it), since that is where the files live.
+"""
+import hashlib
+import os
+import posixpath
+import shutil
+import uuid
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+
+from .storage_utils import clone_file, replace_file
+
+HTTP_CHUNK_SIZE = 1024 * 1024
+HTTP_TIMEOUT = 60
+
+
+class LocalMediaStorage:
+    """Session media under MEDIA_ROOT."""
+
+    is_local = True
+
+    def exists(self, path):
+        return default_storage.exists(path)
+
+    def delete(self, path):
+        try:
+            os.remove(default_storage.path(path))
+        except FileNotFoundError:
+            pass
+
+    def size(self, path):
+        return os.path.getsize(default_storage.path(path))
+
+    def open(self, path):
+        return open(default_storage.path(path), 'rb')
+
+    @contextmanager
+    def local_path(self, path):
+        full_path = default_storage.path(path)
+        if not os.path.exists(full_path):
+            raise FileNotFoundError(f"No such media file: {path}")
+        yield full_path
+
+    def temp_path(self, path):
+        # Next to the destination, so save_from is a rename on the same filesystem
+        name, ext = os.path.splitext(default_storage.path(path))
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        return f"{name}.{uuid.uuid4().hex[:8]}.partial{ext}"
+
+    def save_from(self, local_full_path, path):
+        """Moves a finished file into place as `path` (replacing it atomically)."""
+        full_path = default_storage.path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(local_full_path, full_path)
+        return path
+
+    def save_bytes(self, data, path):
+        temp_path = self.temp_path(path)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        return self.save_from(temp_path, path)
+
+    def copy_in(self, local_full_path, path, new=False):
+        """
+        Publishes a copy of a local file as `path` (a reflink/hardlink when possible).
+        With new=True the next free name is used, as default_storage.save would; returns
+        the path used.
+        """
+        if new:
+            path = default_storage.get_available_name(path)
+        full_path = default_storage.path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if new:
+            clone_file(local_full_path, full_path)
+        else:
+            replace_file(local_full_path, full_path)
+        return path
+
+    def copy(self, src_path, dst_path, new=False):
+        return self.copy_in(default_storage.path(src_path), dst_path, new=new)
+
+
+class ReadThroughCache:
+    """
+    Node-local copies of remote files, validated against the store's ETag (or size +
+    Last-Modified) on every use and evicted least recently used first past max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def entry(self, path):
+        key = hashlib.sha256(path.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + os.path.splitext(path)[1])
+
+    def validator(self, path):
+        try:
+            with open(self.entry(path) + '.version') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def add(self, local_full_path, path, version, link=False):
+        """Caches a file known to match `version` of `path` (moved in, or cloned with link=True)."""
+        entry = self.entry(path)
+        temp_path = f"{entry}.{uuid.uuid4().hex[:8]}.tmp"
+        if link:
+            clone_file(local_full_path, temp_path)
+        else:
+            shutil.move(local_full_path, temp_path)
+        os.replace(temp_path, entry)
+        with open(entry + '.version', 'w') as f:
+            f.write(version)
+        self.evict()
+        return entry
+
+    def discard(self, path):
+        for name in (self.entry(path), self.entry(path) + '.version'):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def hit(self, path, version):
+        """The cached file for `path` if it is at `version`, else None."""
+        entry = self.entry(path)
+        if version is None or self.validator(path) != version or not os.path.exists(entry):
+            return None
+        os.utime(entry)  # Recently used
+        return entry
+
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith(('.tmp', '.version')):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for name in (path, path + '.version'):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+class HTTPMediaStorage:
+    """Session media in an HTTP object store, read through a node-local cache."""
+
+    is_local = False
+
+    def __init__(self, base_url, token=None, cache=None):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+        self.cache = cache or ReadThroughCache(settings.SESSION_MEDIA_CACHE_DIR,
+                                               settings.SESSION_MEDIA_CACHE_MAX_BYTES)
+
+    def url(self, path):
+        key = posixpath.normpath(path.replace('\\', '/'))
+        if key.startswith(('/', '../')) or key in ('.', '..'):
+            # Same rule as FileSystemStorage: nothing outside the media root
+            raise SuspiciousFileOperation(f"Invalid media path: {path}")
+        return self.base_url + key
+
+    @staticmethod
+    def _version(response):
+        etag = response.headers.get('ETag')
+        if etag:
+            return etag
+        if 'Last-Modified' in response.headers:
+            return f"{response.headers.get('Content-Length')}-{response.headers['Last-Modified']}"
+        return None
+
+    def _head(self, path):
+        response = self.session.head(self.url(path), timeout=HTTP_TIMEOUT)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response
+
+    def exists(self, path):
+        return self._head(path) is not None
+
+    def size(self, path):
+        head = self._head(path)
+        if head is None:
+            raise FileNotFoundError(f"No such media file: {path}")
+        return int(head.headers.get('Content-Length') or 0)
+
+    def delete(self, path):
+        response = self.session.delete(self.url(path), timeout=HTTP_TIMEOUT)
+        if response.status_code != 404:
+            response.raise_for_status()
+        self.cache.discard(path)
+
+    def open(self, path):
+        # Seekable and local: PIL and hashing read it more than once
+        with self.local_path(path) as full_path:
+            return open(full_path, 'rb')
+
+    @contextmanager
+    def local_path(self, path):
+        head = self._head(path)
+        if head is None:
+            raise FileNotFoundError(f"No such media file: {path}")
+        version = self._version(head)
+        cached = self.cache.hit(path, version)
+        if cached is not None:
+            yield cached
+            return
+
+        full_path, cached = self._download(path)
+        try:
+            yield full_path
+        finally:
+            if not cached:
+                # Nothing to validate a kept copy against; open handles still read it after the unlink
+                os.remove(full_path)
+
+    def _download(self, path):
+        """Fetches `path`; returns (local file, whether it went into the cache)."""
+        temp_path = self.temp_path(path)
+        try:
+            with self.session.get(self.url(path), stream=True, timeout=HTTP_TIMEOUT) as response:
+                if response.status_code == 404:
+                    raise FileNotFoundError(f"No such media file: {path}")
+                response.raise_for_status()
+                with open(temp_path, 'wb') as f:
+                    for chunk in response.iter_content(HTTP_CHUNK_SIZE):
+                        f.write(chunk)
+                version = self._version(response)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        print(f"[Media Storage] ⬇️ Fetched {path}")
+        if version is None:
+            return temp_path, False
+        return self.cache.add(temp_path, path, version), True
+
+    def temp_path(self, path):
+        temp_dir = os.path.join(self.cache.directory, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        return os.path.join(temp_dir, f"{uuid.uuid4().hex}{os.path.splitext(path)[1]}")
+
+    def _upload(self, local_full_path, path):
+        with open(local_full_path, 'rb') as f:
+            # requests streams file objects instead of reading them into memory
+            response = self.session.put(self.url(path), data=f, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        head = self._head(path)
+        return self._version(head) if head is not None else None
+
+    def save_from(self, local_full_path, path):
+        version = self._upload(local_full_path, path)
+        if version is not None:
+            # The node that wrote the file is likely to read it next
+            self.cache.add(local_full_path, path, version)
+        else:
+            os.remove(local_full_path)
+        return path
+
+    def save_bytes(self, data, path):
+        temp_path = self.temp_path(path)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        return self.save_from(temp_path, path)
+
+    def copy_in(self, local_full_path, path, new=False):
+        # Session file names are random per upload; new=True needs no free-name search here
+        version = self._upload(local_full_path, path)
+        if version is not None:
+            self.cache.add(local_full_path, path, version, link=True)
+        return path
+
+    def copy(self, src_path, dst_path, new=False):
+        with self.local_path(src_path) as full_path:
+            return self.copy_in(full_path, dst_path, new=new)
+
+
+_media_storage = None
+
+
+def get_media_storage():
+    global _media_storage
+    if _media_storage is None:
+        if settings.SESSION_MEDIA_STORAGE == 'http':
+            _media_storage = HTTPMediaStorage(settings.SESSION_MEDIA_STORE_URL, settings.SESSION_MEDIA_STORE_TOKEN)
+        else:
+            _media_storage = LocalMediaStorage()
+    return _media_storage
@@ -0,0 +1,69 @@
+"""
+Content-versioned, signed URLs for committed media.
+
+Working and preview files keep one name for the whole session, so their URLs must be
+revalidated on every use. When an edit is committed, the working file is also published
+under its content hash:
+
+    versions/<aa>/<sha256>.<ext>      (a clone of the working file)
+    /media-versions/<signature>/<aa>/<sha256>.<ext>
+
+The name changes whenever the content does, so the URL can be cached by browsers and
+CDNs as immutable; going back to an earlier state (reset, a repeated edit) or showing
+the same image again is answered from that cache. The signature is an HMAC of the name
+(keyed by SECRET_KEY), so only URLs the server handed out are served; MEDIA_URL must
+not serve VERSION_DIR itself (serve_media refuses it, see the README for nginx).
+
+Versions are temporary media like the rest (media_gc), so they are only cached for as long
+as the GC keeps an unused one.
+"""
+import os
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+from . import render_cache
+from .media_storage import get_media_storage
+
+VERSION_DIR = 'versions'
+SIGNING_SALT = 'imageditor.media_versions'
+
+
+def version_path(name):
+    """Storage path of a version name (<aa>/<sha256>.<ext>)."""
+    return f"{VERSION_DIR}/{name}"
+
+
+def max_age():
+    """Cache lifetime of a version URL: never longer than media_gc keeps a version nobody fetches."""
+    return min(settings.MEDIA_VERSION_MAX_AGE, settings.MEDIA_TTL_SECONDS)
+
+
+def _signer():
+    return signing.Signer(salt=SIGNING_SALT)
+
+
+def signed_url(name):
+    return reverse('media_version', args=[_signer().signature(name), name])
+
+
+def valid_signature(name, signature):
+    return constant_time_compare(_signer().signature(name), signature)
+
+
+def publish(path, digest=None):
+    """
+    Publishes the committed session file `path` as an immutable version and returns
+    (version storage path, signed URL). `digest` is its SHA-256 when already known.
+    """
+    storage = get_media_storage()
+    extension = os.path.splitext(path)[1].lower()
+    with storage.local_path(path) as full_path:
+        digest = digest or render_cache.content_hash(full_path)
+        name = f"{digest[:2]}/{digest}{extension}"
+        if not storage.exists(version_path(name)):
+            # OPTIMIZATION: Same content, same version: an earlier state is never stored twice
+            storage.copy_in(full_path, version_path(name))
+    return version_path(name), signed_url(name)
@@ -0,0 +1,17 @@
+from django.middleware.gzip import GZipMiddleware
+
+# Already-compressed media gains nothing from gzip, and compressing it would break byte ranges
+_UNCOMPRESSED_TYPES = ('text/event-stream', 'video/', 'audio/', 'image/')
+
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves server-sent event streams, media files and partial
+    (206) responses alone. Compressing event streams per chunk would make proxies
+    and browsers buffer the events.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(_UNCOMPRESSED_TYPES) or response.has_header('Content-Range'):
+            return response
+        return super().process_response(request, response)
@@ -21,4 +21,24 @@ class UserEdit(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.user.username} - {self.media_type} - {self.created_at:%Y-%m-%d}"
\ No newline at end of file
+        return f"{self.user.username} - {self.media_type} - {self.created_at:%Y-%m-%d}"
+
+class MediaSession(models.Model):
+    """
+    An editing session's temporary files on disk (see media_sessions.py), for per-user
+    quotas. `owner_key` is "user:<id>", or "anon:<session key>" for anonymous uploads.
+    """
+    session_id = models.CharField(max_length=32, unique=True)
+    owner_key = models.CharField(max_length=64, db_index=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    media_type = models.CharField(max_length=10, choices=[('image', 'Image'), ('video', 'Video')])
+    files = models.JSONField(default=list)
+    bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_access = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['last_access']
+
+    def __str__(self):
+        return f"{self.owner_key} - {self.media_type} - {self.session_id}"
@@ -0,0 +1,151 @@
+"""
+Lightweight video metadata probing.
+
+Opening a VideoFileClip starts an ffmpeg reader process (plus an audio reader when the
+file has sound) and decodes the first frame. probe_video reads the container and
+stream headers with a single ffprobe call instead and returns a plain dict:
+
+    width, height   - display size (already swapped for 90/270 degree rotation)
+    duration, fps, n_frames
+    video_codec, audio_codec (None when there is no audio)
+    rotation        - clockwise display rotation in degrees
+    keyframes       - keyframe timestamps in seconds (only when keyframes=True)
+
+Results are cached per (path, size, mtime), so the upload view, the render task and
+any planner share one probe per file version. Without an ffprobe binary, the header
+parsing MoviePy does with its own ffmpeg binary is used instead.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+from fractions import Fraction
+from functools import lru_cache
+
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY') or shutil.which('ffprobe')
+PROBE_CACHE_SIZE = 256
+
+_PTS_TIME_RE = re.compile(r'pts_time:\s*([0-9.]+)')
+
+
+def probe_video(full_path, keyframes=False):
+    """Returns the metadata dict described above for the file at full_path."""
+    stat = os.stat(full_path)
+    info = _cached_probe(full_path, stat.st_size, stat.st_mtime_ns, keyframes)
+    return dict(info)
+
+
+@lru_cache(maxsize=PROBE_CACHE_SIZE)
+def _cached_probe(full_path, size, mtime_ns, keyframes):
+    # size and mtime_ns are only part of the cache key: a rewritten file is probed again
+    if FFPROBE_BINARY:
+        return _ffprobe(full_path, keyframes)
+    return _ffmpeg_probe(full_path, keyframes)
+
+
+def _ffprobe(full_path, keyframes):
+    sections = 'stream:format'
+    if keyframes:
+        # Packet flags come from the demuxer, so keyframes are listed without decoding
+        sections += ':packet=stream_index,pts_time,flags'
+
+    output = subprocess.run(
+        [FFPROBE_BINARY, '-v', 'error', '-print_format', 'json', '-show_entries', sections, full_path],
+        capture_output=True, check=True,
+    ).stdout
+    data = json.loads(output)
+
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        raise ValueError(f"No video stream found in {full_path}")
+
+    rotation = _ffprobe_rotation(video)
+    width, height = int(video['width']), int(video['height'])
+    if rotation in (90, 270):
+        width, height = height, width
+
+    fps = _parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate'))
+    duration = float(data.get('format', {}).get('duration') or video.get('duration') or 0)
+
+    info = {
+        'width': width,
+        'height': height,
+        'duration': duration,
+        'fps': fps,
+        'n_frames': int(video['nb_frames']) if video.get('nb_frames') else int(duration * fps),
+        'video_codec': video.get('codec_name'),
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'rotation': rotation,
+        'keyframes': None,
+    }
+
+    if keyframes:
+        info['keyframes'] = tuple(sorted(
+            float(p['pts_time']) for p in data.get('packets', [])
+            if p.get('stream_index') == video['index'] and 'K' in p.get('flags', '')
+            and p.get('pts_time') not in (None, 'N/A')
+        ))
+    return info
+
+
+def _ffprobe_rotation(stream):
+    # Older ffmpeg reports a "rotate" tag, newer ones a display matrix (counter-clockwise)
+    rotate_tag = stream.get('tags', {}).get('rotate')
+    if rotate_tag is not None:
+        return int(float(rotate_tag)) % 360
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            return -int(float(side_data['rotation'])) % 360
+    return 0
+
+
+def _parse_rate(rate):
+    try:
+        return float(Fraction(rate))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _ffmpeg_probe(full_path, keyframes):
+    infos = ffmpeg_parse_infos(full_path)
+    if not infos.get('video_found'):
+        raise ValueError(f"No video stream found in {full_path}")
+
+    rotation = int(infos.get('video_rotation', 0)) % 360
+    width, height = infos['video_size']
+    if rotation in (90, 270):
+        width, height = height, width
+
+    audio_stream = next(
+        (s for i in infos.get('inputs', []) for s in i.get('streams', []) if s.get('stream_type') == 'audio'),
+        None,
+    )
+
+    info = {
+        'width': width,
+        'height': height,
+        'duration': infos.get('duration') or 0.0,
+        'fps': infos.get('video_fps') or 0.0,
+        'n_frames': infos.get('video_n_frames') or 0,
+        'video_codec': infos.get('video_codec_name'),
+        # ffmpeg's banner parsing doesn't keep the audio codec name
+        'audio_codec': audio_stream.get('codec_name', 'unknown') if audio_stream else None,
+        'rotation': rotation,
+        'keyframes': None,
+    }
+
+    if keyframes:
+        # Decodes keyframes only (skip_frame nokey) and reads their timestamps from showinfo
+        stderr = subprocess.run(
+            [FFMPEG_BINARY, '-hide_banner', '-skip_frame', 'nokey', '-i', full_path,
+             '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'],
+            capture_output=True, text=True, check=True,
+        ).stderr
+        info['keyframes'] = tuple(float(t) for t in _PTS_TIME_RE.findall(stderr))
+    return info
@@ -0,0 +1,104 @@
+"""
+"Save to profile" uploads to Cloudinary, run as a Celery task instead of inside the request.
+
+The view copies the working file (a hardlink/reflink on local storage) into PROFILE_UPLOAD_DIR (so later edits
+can't change what is being uploaded) and queues upload_to_profile_task; the task id
+is the job id the browser polls through the task status endpoint.
+
+The file is streamed from disk in PROFILE_UPLOAD_CHUNK_SIZE parts under one
+X-Unique-Upload-Id, which is how Cloudinary's chunked upload (upload_large) works.
+When a part fails with a network or server error the task is retried with exponential
+backoff and resumes at that part; errors that a retry can't fix (bad credentials,
+rejected file) fail the job right away.
+"""
+import os
+
+import cloudinary.exceptions
+import cloudinary.uploader
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+
+from . import media_gc
+from .media_storage import get_media_storage
+
+PROFILE_UPLOAD_DIR = 'profile_uploads'
+
+# 4xx answers: retrying the same request won't succeed (429/420 RateLimited is retried)
+PERMANENT_ERRORS = (
+    cloudinary.exceptions.BadRequest,
+    cloudinary.exceptions.AuthorizationRequired,
+    cloudinary.exceptions.NotAllowed,
+    cloudinary.exceptions.NotFound,
+    cloudinary.exceptions.AlreadyExists,
+)
+
+
+class UploadInterrupted(Exception):
+    """A retryable error while sending the part that starts at `offset`."""
+
+    def __init__(self, offset, cause):
+        super().__init__(f"Upload interrupted at byte {offset}: {cause}")
+        self.offset = offset
+
+
+def snapshot(working_path, job_id):
+    """Clones the working file for upload job `job_id` and returns the clone's storage path."""
+    extension = os.path.splitext(working_path)[1]
+    path = get_media_storage().copy(working_path, os.path.join(PROFILE_UPLOAD_DIR, f"{job_id}{extension}"), new=True)
+    # Collected like other temporary media if the job never gets to delete it
+    media_gc.touch(path)
+    return path
+
+
+def discard_snapshot(path):
+    try:
+        get_media_storage().delete(path)
+    except OSError as e:
+        print(f"[Profile Upload] ⚠️ Could not delete {path}: {e}")
+    media_gc.forget(path)
+
+
+def retry_countdown(retries):
+    """Seconds to wait before retry number retries + 1 (exponential, with jitter)."""
+    return get_exponential_backoff_interval(
+        factor=settings.PROFILE_UPLOAD_RETRY_BACKOFF,
+        retries=retries,
+        maximum=settings.PROFILE_UPLOAD_RETRY_BACKOFF_MAX,
+        full_jitter=True,
+    )
+
+
+def upload_from(full_path, upload_id, offset=0, chunk_size=None, **options):
+    """
+    Sends full_path to Cloudinary from byte `offset` on, one chunk per request, and
+    returns the upload result (the response to the last chunk). Raises UploadInterrupted
+    on retryable errors so the caller can resume at the failed chunk with the same upload_id.
+    """
+    if chunk_size is None:
+        chunk_size = settings.PROFILE_UPLOAD_CHUNK_SIZE
+
+    size = os.path.getsize(full_path)
+    if size == 0:
+        raise ValueError(f"Nothing to upload: {os.path.basename(full_path)} is empty")
+    filename = os.path.basename(full_path)
+    result = None
+
+    with open(full_path, 'rb') as f:
+        f.seek(offset)
+        while offset < size:
+            chunk = f.read(chunk_size)
+            headers = {
+                "Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{size}",
+                "X-Unique-Upload-Id": upload_id,
+            }
+            try:
+                result = cloudinary.uploader.upload_large_part((filename, chunk), http_headers=headers, **options)
+            except PERMANENT_ERRORS:
+                raise
+            except cloudinary.exceptions.Error as e:
+                raise UploadInterrupted(offset, e) from e
+            offset += len(chunk)
+            # Later chunks must name the same asset (as upload_large does)
+            options['public_id'] = result.get('public_id', options.get('public_id'))
+
+    return result
@@ -0,0 +1,100 @@
+"""
+Frame-accurate progress reporting for video tasks.
+
+MoviePy drives its encoder from a proglog frame iterator (the "frame_index" bar).
+TaskProgressLogger hooks that iterator and publishes frames done, total frames,
+encoding fps and ETA as the Celery task's PROGRESS state and on the task's event channel.
+Because it runs between frames, it is also where a cancelled render is aborted.
+"""
+import time
+
+from proglog import ProgressBarLogger
+
+from . import video_jobs
+
+PROGRESS_STATE = 'PROGRESS'
+FRAME_BAR = 'frame_index'
+
+
+class RenderCancelled(Exception):
+    """Raised from the frame loop when the task was cancelled or superseded."""
+
+
+class TaskProgressLogger(ProgressBarLogger):
+    """
+    Proglog logger that forwards encoder progress to `task.update_state`.
+    Updates are throttled to one per `min_interval` seconds (plus the final frame)
+    so the result backend isn't written on every frame. The cancellation flag is
+    polled at most every `cancel_check_interval` seconds.
+
+    When the render also writes a live HLS stream, pass its playlist path and URL:
+    once segments exist, updates carry `stream_url` and `segments_ready`.
+    """
+
+    def __init__(self, task, min_interval=0.5, cancel_check_interval=0.25, stream_playlist=None, stream_url=None):
+        super().__init__()
+        self.task = task
+        self.stream_playlist = stream_playlist
+        self.stream_url = stream_url
+        self.min_interval = min_interval
+        self.cancel_check_interval = cancel_check_interval
+        self.started_at = None
+        self.last_report_at = 0.0
+        self.last_cancel_check_at = 0.0
+        self.last_frames_done = None
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        # write_videofile also reports an audio "chunk" bar; only frames count
+        if bar != FRAME_BAR or attr != 'index':
+            return
+
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+
+        if now - self.last_cancel_check_at >= self.cancel_check_interval:
+            self.last_cancel_check_at = now
+            if video_jobs.is_cancelled(self.task.request.id):
+                raise RenderCancelled(self.task.request.id)
+
+        total_frames = self.bars[bar].get('total') or 0
+        # proglog re-sends index == total once the iterator is exhausted
+        frames_done = min(value + 1, total_frames) if total_frames else value + 1
+        if frames_done == self.last_frames_done:
+            return
+        is_last_frame = total_frames and frames_done >= total_frames
+
+        if not is_last_frame and now - self.last_report_at < self.min_interval:
+            return
+        self.last_report_at = now
+        self.last_frames_done = frames_done
+
+        self.report(frames_done, total_frames, now - self.started_at)
+
+    def report(self, frames_done, total_frames, elapsed):
+        fps = frames_done / elapsed if elapsed > 0 else 0.0
+        eta = (total_frames - frames_done) / fps if fps and total_frames else None
+
+        meta = {
+            "frames_done": frames_done,
+            "total_frames": total_frames,
+            "percent": round(100.0 * frames_done / total_frames, 1) if total_frames else None,
+            "fps": round(fps, 2),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        }
+        segments_ready = self.segments_ready()
+        if segments_ready:
+            meta["stream_url"] = self.stream_url
+            meta["segments_ready"] = segments_ready
+        self.task.update_state(state=PROGRESS_STATE, meta=meta)
+        video_jobs.publish_task_event(self.task.request.id, PROGRESS_STATE, meta)
+
+    def segments_ready(self):
+        """Number of finished segments in the live stream playlist (0 before the first one)."""
+        if not self.stream_playlist:
+            return 0
+        try:
+            with open(self.stream_playlist) as f:
+                return sum(1 for line in f if line.startswith('#EXTINF'))
+        except OSError:
+            return 0
@@ -0,0 +1,207 @@
+"""
+Content-addressed cache for rendered video previews.
+
+A render is identified by the content of its input, the tool, the canonicalized
+options and the encoder settings. Identical requests can then be answered by
+copying an existing output instead of running a full render again.
+
+Cached outputs live in a size-bounded directory under MEDIA_ROOT and are evicted
+least-recently-used first. Entries are clones of session previews (possibly hardlinks,
+see storage_utils), so a cache hit refreshes a <entry>.used marker rather than the
+entry's own mtime, which is part of every linked file's identity.
+
+Content hashes that are already known (uploads, finished renders) are recorded per
+(device, inode, size, mtime) in-process and in Redis, so no web process has to read a
+working video again just to build its render cache key.
+"""
+import os
+import json
+import hashlib
+import uuid
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+from .storage_utils import clone_file
+from .video_jobs import get_redis
+
+RENDER_CACHE_DIR = 'render_cache'
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB reads keep hashing memory flat for large videos
+
+
+def get_cache_dir():
+    cache_dir = os.path.join(settings.MEDIA_ROOT, RENDER_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+@lru_cache(maxsize=256)
+def _hash_file(full_path, size, mtime_ns):
+    # size and mtime_ns are part of the memo key so a rewritten file is hashed again
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Hashes computed while a file was being written (e.g. a streamed upload), keyed by
+# (device, inode, size, mtime) so hardlinked session files find them too
+_known_hashes = {}
+KNOWN_HASHES_MAX = 256
+# ... and shared with the other processes (render workers, other web processes)
+KNOWN_HASH_PREFIX = 'render:hash:'
+USED_SUFFIX = '.used'
+
+
+def _file_identity(stat):
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _remember_identity(identity, digest):
+    if len(_known_hashes) >= KNOWN_HASHES_MAX:
+        _known_hashes.pop(next(iter(_known_hashes)))
+    _known_hashes[identity] = digest
+    try:
+        get_redis().set(KNOWN_HASH_PREFIX + ':'.join(map(str, identity)), digest, ex=settings.MEDIA_TTL_SECONDS)
+    except redis.RedisError as e:
+        print(f"[Render Cache] ⚠️ Could not share a content hash: {e}")
+
+
+def remember_hash(full_path, digest):
+    """Records the SHA-256 of a file that is already known, so content_hash won't read it."""
+    _remember_identity(_file_identity(os.stat(full_path)), digest)
+
+
+def _known_hash(identity):
+    known = _known_hashes.get(identity)
+    if known:
+        return known
+    try:
+        known = get_redis().get(KNOWN_HASH_PREFIX + ':'.join(map(str, identity)))
+    except redis.RedisError:
+        return None
+    if known:
+        _known_hashes[identity] = known
+    return known
+
+
+def copy_known_hash(src_full_path, dst_full_path):
+    """Carries a known hash over to a copy of a file (a reflink or copy gets a new identity)."""
+    digest = _known_hash(_file_identity(os.stat(src_full_path)))
+    if digest:
+        remember_hash(dst_full_path, digest)
+
+
+def content_hash(full_path):
+    """Returns the SHA-256 of a file, memoized per (path, size, mtime) and shared per identity."""
+    stat = os.stat(full_path)
+    identity = _file_identity(stat)
+    known = _known_hash(identity)
+    if known:
+        return known
+    digest = _hash_file(full_path, stat.st_size, stat.st_mtime_ns)
+    _remember_identity(identity, digest)
+    return digest
+
+
+def canonicalize_options(options):
+    """
+    Normalizes an options dict so equivalent requests produce the same key:
+    keys are sorted and integral floats (1.0) collapse to ints (1).
+    """
+    def normalize(value):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, dict):
+            return {str(k): normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+
+    return json.dumps(normalize(options), sort_keys=True, separators=(',', ':'), default=str)
+
+
+def render_cache_key(input_hash, tool_key, options, encoder_settings):
+    """hash(input content hash, tool_key, canonicalized options, encoder settings)"""
+    payload = '|'.join([
+        input_hash,
+        tool_key,
+        canonicalize_options(options),
+        canonicalize_options(encoder_settings),
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _entry_path(key, extension='mp4'):
+    return os.path.join(get_cache_dir(), f"{key}.{extension}")
+
+
+def lookup(key, extension='mp4'):
+    """Returns the cached output path for `key`, or None on a miss."""
+    path = _entry_path(key, extension)
+    if not os.path.exists(path):
+        return None
+    # Marks the entry as recently used for eviction (its own mtime is shared with linked previews)
+    with open(path + USED_SUFFIX, 'a'):
+        pass
+    os.utime(path + USED_SUFFIX)
+    return path
+
+
+def store(key, source_full_path, extension='mp4'):
+    """Adds a finished render to the cache and enforces the size budget."""
+    path = _entry_path(key, extension)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        # OPTIMIZATION: A reflink/hardlink of the finished preview instead of a byte copy
+        clone_file(source_full_path, tmp_path)
+        os.replace(tmp_path, path)
+        copy_known_hash(source_full_path, path)
+    except OSError as e:
+        print(f"[Render Cache] ❌ Could not store {key}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    evict()
+    return path
+
+
+def evict(max_bytes=None):
+    """Deletes least-recently-used entries until the cache fits in `max_bytes`."""
+    if max_bytes is None:
+        max_bytes = settings.VIDEO_RENDER_CACHE_MAX_BYTES
+
+    entries = []
+    total = 0
+    with os.scandir(get_cache_dir()) as it:
+        for entry in it:
+            if not entry.is_file() or entry.name.endswith(('.tmp', USED_SUFFIX)):
+                continue
+            stat = entry.stat()
+            try:
+                last_use = max(stat.st_mtime, os.path.getmtime(entry.path + USED_SUFFIX))
+            except FileNotFoundError:
+                last_use = stat.st_mtime  # Never hit since it was stored
+            entries.append((last_use, stat.st_size, entry.path))
+            total += stat.st_size
+
+    if total <= max_bytes:
+        return
+
+    entries.sort()  # Oldest access first
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            print(f"[Render Cache] 🗑️ Evicted {os.path.basename(path)}")
+        except FileNotFoundError:
+            total -= size
+        try:
+            os.remove(path + USED_SUFFIX)
+        except FileNotFoundError:
+            pass
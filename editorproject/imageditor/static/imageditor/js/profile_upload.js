@@ -0,0 +1,21 @@
+/**
+ * Save-to-profile helpers shared by the image, AI and video editors
+ */
+
+const PROFILE_UPLOAD_POLL_MS = 1500;
+const PROFILE_UPLOAD_MAX_ATTEMPTS = 400; // ~10 minutes, then the page stops waiting
+
+// Polls the background upload job until it finishes; resolves with its status, throws on failure
+async function waitForProfileUpload(jobId, statusUrl = '/api/task-status/') {
+    for (let attempt = 0; attempt < PROFILE_UPLOAD_MAX_ATTEMPTS; attempt++) {
+        await new Promise(resolve => setTimeout(resolve, PROFILE_UPLOAD_POLL_MS));
+        const res = await fetch(`${statusUrl}${jobId}/`);
+        if (!res.ok) continue; // Transient server error: ask again next time
+        const data = await res.json();
+        if (data.status === 'SUCCESS') return data;
+        if (data.status === 'FAILURE' || data.status === 'REVOKED') {
+            throw new Error(data.error || 'Upload to profile failed.');
+        }
+    }
+    throw new Error('Upload to profile is taking too long; check your profile later.');
+}
@@ -9,6 +9,12 @@ let workingFile = null;
 let previewFile = null;
 let currentToolKey = null;
 let pollingInterval = null;
+let taskEvents = null;
+let currentTaskId = null;
+let liveStream = null;      // hls.js player while a preview render is streaming
+let liveStreamUrl = null;
+let liveStreamFallbackSrc = null;
+const TASK_EVENTS_FIRST_MESSAGE_MS = 5000;
 
 // 2. ELEMENT SELECTORS
 const elements = {
@@ -18,11 +24,13 @@ const elements = {
     overlay: document.getElementById('processing-overlay'),
     progressBar: document.getElementById('task-progress-bar'),
     statusText: document.getElementById('status-text'),
+    cancelBtn: document.getElementById('cancel-task-btn'),
     applyBtn: document.getElementById('apply-btn'),
     commitBtn: document.getElementById('commit-btn'),
     resetBtn: document.getElementById('reset-btn'),
     downloadBtn: document.getElementById('download-btn'),
-    settingsArea: document.getElementById('tool-settings-area')
+    settingsArea: document.getElementById('tool-settings-area'),
+    thumbnailStrip: document.getElementById('thumbnail-strip')
 };
 
 // --- UTILS ---
@@ -268,24 +276,19 @@ elements.fileInput.addEventListener('change', async (e) => {
     const file = e.target.files[0];
     if (!file) return;
 
-    const formData = new FormData();
-    formData.append('video', file);
-
-    elements.uploadContainer.innerHTML = `<div class="spinner-border text-primary"></div><p class="mt-2">Uploading...</p>`;
+    elements.uploadContainer.innerHTML = `<div class="spinner-border text-primary"></div><p class="mt-2" id="upload-status">Uploading...</p>`;
 
     try {
-        const response = await fetch(window.EditorConfig.endpoints.initialUpload, {
-            method: 'POST',
-            body: formData,
-            headers: { 'X-CSRFToken': window.EditorConfig.csrfToken }
+        const data = await uploadVideo(file, (fraction) => {
+            const status = document.getElementById('upload-status');
+            if (status) status.innerText = `Uploading... ${Math.floor(fraction * 100)}%`;
         });
-
-        const data = await response.json();
         if (data.success) {
             originalFile = data.original_file_path;
             workingFile = data.working_file_path;
             previewFile = data.preview_file_path;
-            window.EditorConfig.originalVideoUrl = data.temp_video_url;
+            // Signed, immutable URL: resetting replays the original from the browser cache
+            window.EditorConfig.originalVideoUrl = data.version_url || data.temp_video_url;
 
             elements.videoPlayer.src = data.temp_video_url;
 
@@ -300,6 +303,7 @@ elements.fileInput.addEventListener('change', async (e) => {
             elements.applyBtn.disabled = false;
             elements.resetBtn.disabled = false;
 
+            if (data.thumbnails_index_url) loadThumbnails(data.thumbnails_index_url);
         }
     } catch (err) {
         alert("Upload error.");
@@ -307,6 +311,90 @@ elements.fileInput.addEventListener('change', async (e) => {
     }
 });
 
+// Resumable upload: the file goes up in chunks; after a dropped connection the upload
+// continues from the last byte the server has instead of starting over
+const UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+async function uploadVideo(file, onProgress) {
+    const endpoints = window.EditorConfig.endpoints;
+    const headers = { 'X-CSRFToken': window.EditorConfig.csrfToken };
+
+    const startForm = new FormData();
+    startForm.append('filename', file.name);
+    startForm.append('size', file.size);
+    const startRes = await fetch(endpoints.uploadStart, { method: 'POST', body: startForm, headers });
+    const start = await startRes.json();
+
+    if (!start.success) {
+        // Resumable uploads unavailable: send the whole file in one request
+        const formData = new FormData();
+        formData.append('video', file);
+        const response = await fetch(endpoints.initialUpload, { method: 'POST', body: formData, headers });
+        return response.json();
+    }
+
+    const chunkUrl = `${endpoints.uploadChunk}${start.upload_id}/`;
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+        const end = Math.min(offset + UPLOAD_CHUNK_BYTES, file.size);
+        try {
+            const res = await fetch(chunkUrl, {
+                method: 'PUT',
+                body: file.slice(offset, end),
+                headers: { ...headers, 'Content-Range': `bytes ${offset}-${end - 1}/${file.size}` }
+            });
+            const data = await res.json();
+            if (!data.success) throw new Error(data.error);
+            offset = data.received;
+            failures = 0;
+            onProgress(offset / file.size);
+        } catch (err) {
+            if (++failures > UPLOAD_MAX_RETRIES) throw err;
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            // Resume from whatever actually reached the server
+            const status = await fetch(chunkUrl).then(r => r.json()).catch(() => null);
+            if (status && status.success) offset = status.received;
+        }
+    }
+
+    const finalRes = await fetch(`${chunkUrl}finalize/`, { method: 'POST', headers });
+    return finalRes.json();
+}
+
+// Timeline thumbnails: one sprite sheet + JSON index, built in the background after upload.
+// Scrubbing the strip only touches the sprite instead of streaming the full video.
+async function loadThumbnails(indexUrl, attempt = 0) {
+    const res = await fetch(indexUrl, { cache: 'no-store' }).catch(() => null);
+    if (!res || !res.ok) {
+        if (attempt < 30) setTimeout(() => loadThumbnails(indexUrl, attempt + 1), 2000);
+        return;
+    }
+    renderThumbnailStrip(await res.json());
+}
+
+function renderThumbnailStrip(index) {
+    const strip = elements.thumbnailStrip;
+    if (!strip) return;
+
+    if (index.poster_url) elements.videoPlayer.poster = index.poster_url;
+
+    strip.innerHTML = '';
+    index.thumbnails.forEach(thumb => {
+        const tile = document.createElement('div');
+        tile.className = 'thumbnail-tile';
+        tile.style.width = `${index.tile_width}px`;
+        tile.style.height = `${index.tile_height}px`;
+        tile.style.backgroundImage = `url(${index.sprite_url})`;
+        tile.style.backgroundPosition = `-${thumb.x}px -${thumb.y}px`;
+        tile.title = `${thumb.time.toFixed(1)}s`;
+        tile.addEventListener('click', () => { elements.videoPlayer.currentTime = thumb.time; });
+        strip.appendChild(tile);
+    });
+    strip.style.display = 'flex';
+}
+
 // 6. PREVIEW & POLLING
 elements.applyBtn.addEventListener('click', async () => {
     if (!currentToolKey) return alert("Select a tool first!");
@@ -403,7 +491,15 @@ elements.applyBtn.addEventListener('click', async () => {
 
         const data = await res.json();
         if (data.success) {
-            startPolling(data.task_id);
+            // Cache hits come back finished, without a task to poll. The server cancelled
+            // the render they replace; stop following it so it can't swap the player later.
+            if (data.cached) {
+                stopWatching();
+                currentTaskId = null;
+                finishTask(data);
+            } else {
+                watchTask(data.task_id);
+            }
         } else {
             throw new Error(data.error || "Server error.");
         }
@@ -413,27 +509,131 @@ elements.applyBtn.addEventListener('click', async () => {
     }
 });
 
+// Task updates are pushed over server-sent events; interval polling is the fallback
+function watchTask(taskId) {
+    stopWatching();
+    currentTaskId = taskId;
+    if (!window.EventSource || !window.EditorConfig.endpoints.events) return startPolling(taskId);
+
+    const source = new EventSource(`${window.EditorConfig.endpoints.events}${taskId}/`);
+    taskEvents = source;
+    // The server sends the current state right away; silence means something buffers the stream
+    const firstMessageTimer = setTimeout(() => {
+        if (taskEvents === source) startPolling(taskId);
+    }, TASK_EVENTS_FIRST_MESSAGE_MS);
+    source.onmessage = (e) => {
+        clearTimeout(firstMessageTimer);
+        handleTaskStatus(JSON.parse(e.data));
+    };
+    source.onerror = () => {
+        clearTimeout(firstMessageTimer);
+        // Stream refused (204 without an ASGI server) or dropped before a final state: poll instead
+        if (taskEvents === source) startPolling(taskId);
+    };
+}
+
 function startPolling(taskId) {
-    if (pollingInterval) clearInterval(pollingInterval);
+    stopWatching();
     pollingInterval = setInterval(async () => {
         const res = await fetch(`${window.EditorConfig.endpoints.status}${taskId}/`);
-        const data = await res.json();
-
-        if (data.status === 'SUCCESS') {
-            clearInterval(pollingInterval);
-            finishTask(data);
-        } else if (data.status === 'FAILURE') {
-            clearInterval(pollingInterval);
-            elements.overlay.style.display = 'none';
-            alert("Processing failed.");
-        } else {
-            let cur = parseInt(elements.progressBar.style.width.replace('%', '')) || 0;
-            if (cur < 90) elements.progressBar.style.width = (cur + 5) + '%';
-        }
+        handleTaskStatus(await res.json());
     }, 2000);
 }
 
+if (elements.cancelBtn) {
+    elements.cancelBtn.addEventListener('click', async () => {
+        if (!currentTaskId) return;
+        const taskId = currentTaskId;
+        stopWatching();
+        elements.overlay.style.display = 'none';
+        await fetch(`${window.EditorConfig.endpoints.cancel}${taskId}/`, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': window.EditorConfig.csrfToken }
+        });
+    });
+}
+
+function stopWatching() {
+    if (taskEvents) {
+        taskEvents.close();
+        taskEvents = null;
+    }
+    if (pollingInterval) {
+        clearInterval(pollingInterval);
+        pollingInterval = null;
+    }
+}
+
+function handleTaskStatus(data) {
+    if (data.status === 'SUCCESS') {
+        stopWatching();
+        finishTask(data);
+    } else if (data.status === 'FAILURE') {
+        stopWatching();
+        stopLiveStream(true);
+        elements.overlay.style.display = 'none';
+        alert("Processing failed.");
+    } else if (data.status === 'REVOKED') {
+        // Cancelled, or superseded by a newer preview of this session
+        stopWatching();
+        stopLiveStream(true);
+        elements.overlay.style.display = 'none';
+    } else if (data.progress) {
+        showProgress(data.progress);
+        if (data.progress.stream_url) startLiveStream(data.progress.stream_url);
+    } else {
+        let cur = parseInt(elements.progressBar.style.width.replace('%', '')) || 0;
+        if (cur < 90) elements.progressBar.style.width = (cur + 5) + '%';
+    }
+}
+
+function showProgress(progress) {
+    if (progress.percent != null) elements.progressBar.style.width = progress.percent + '%';
+
+    let text = `Rendering frame ${progress.frames_done} / ${progress.total_frames}`;
+    if (progress.fps) text += ` · ${progress.fps} fps`;
+    if (progress.eta_seconds != null) text += ` · ~${Math.ceil(progress.eta_seconds)}s left`;
+    elements.statusText.innerText = text;
+}
+
+// Live preview: play the render's HLS segments while it is still encoding
+function startLiveStream(streamUrl) {
+    if (liveStreamUrl === streamUrl) return;
+    const player = elements.videoPlayer;
+    const fallbackSrc = player.currentSrc || player.src;
+
+    if (window.Hls && Hls.isSupported()) {
+        stopLiveStream(false);
+        liveStream = new Hls({ startPosition: 0 });
+        liveStream.loadSource(streamUrl);
+        liveStream.attachMedia(player);
+    } else if (player.canPlayType('application/vnd.apple.mpegurl')) {
+        player.src = streamUrl;
+    } else {
+        return; // No HLS support: wait for the finished file
+    }
+
+    liveStreamUrl = streamUrl;
+    liveStreamFallbackSrc = fallbackSrc;
+    player.play().catch(() => {});
+    elements.overlay.style.display = 'none';
+}
+
+function stopLiveStream(restorePrevious) {
+    if (liveStream) {
+        liveStream.destroy();
+        liveStream = null;
+    }
+    if (liveStreamUrl && restorePrevious && liveStreamFallbackSrc) {
+        elements.videoPlayer.src = liveStreamFallbackSrc;
+        elements.videoPlayer.load();
+    }
+    liveStreamUrl = null;
+    liveStreamFallbackSrc = null;
+}
+
 function finishTask(data) {
+    stopLiveStream(false);
     previewFile = data.preview_file_path;
     const currentTime = elements.videoPlayer.currentTime;
     elements.videoPlayer.src = `${data.preview_url}?t=${new Date().getTime()}`;
@@ -508,6 +708,8 @@ document.getElementById('save-to-profile-btn').addEventListener('click', async f
 
         const data = await res.json();
         if (data.success) {
+            // The upload runs in the background; wait for the job to finish
+            await waitForProfileUpload(data.job_id, window.EditorConfig.endpoints.status);
             btn.innerHTML = `<i class="bi bi-check-circle-fill"></i> Saved!`;
             btn.classList.replace('btn-save-profile', 'btn-success');
         } else {
@@ -516,6 +718,7 @@ document.getElementById('save-to-profile-btn').addEventListener('click', async f
             btn.innerHTML = originalContent;
         }
     } catch (err) {
+        alert("Error: " + err.message);
         btn.disabled = false;
         btn.innerHTML = originalContent;
         console.error(err);
@@ -0,0 +1,126 @@
+"""
+Helpers for the per-session media files (original / working / preview).
+
+A new session starts with three identical files. Instead of writing the bytes three
+times, the working and preview files are created as clones of the original:
+
+    1. reflink (copy-on-write extent sharing, e.g. Btrfs/XFS): independent files
+       that only store blocks once modified
+    2. hardlink: the same inode under another name
+    3. plain copy, when the filesystem supports neither
+
+Clones stay cheap only as long as session files are never modified in place. Every
+writer replaces the file instead (delete + save, or write a temp file and
+os.replace), which gives the modified name a new inode and leaves its siblings as
+they were. Session files must keep being written that way; replace_file does it
+for file-to-file copies (reset, commit) without reading the file into memory.
+"""
+import errno
+import os
+import shutil
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks, hardlinks still work on NTFS
+    fcntl = None
+
+# ioctl(dest_fd, FICLONE, src_fd) from <linux/fs.h>
+FICLONE = 0x40049409
+
+COPY_CHUNK_SIZE = 8 * 1024 ** 2
+
+_NOT_SUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EPERM, errno.EMLINK, errno.ENOSYS}
+
+
+def _reflink(src_full, dst_full):
+    with open(src_full, 'rb') as src, open(dst_full, 'xb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError as e:
+            error = e
+    os.remove(dst_full)
+    if error.errno not in _NOT_SUPPORTED:
+        raise error
+    return False
+
+
+def clone_file(src_full, dst_full):
+    """
+    Creates dst_full with the contents of src_full without copying bytes when the
+    filesystem allows it. Returns the method used: 'reflink', 'hardlink' or 'copy'.
+    """
+    if fcntl is not None and _reflink(src_full, dst_full):
+        return 'reflink'
+
+    try:
+        os.link(src_full, dst_full)
+        return 'hardlink'
+    except OSError as e:
+        if e.errno not in _NOT_SUPPORTED:
+            raise
+
+    stream_copy(src_full, dst_full)
+    return 'copy'
+
+
+def stream_copy(src_full, dst_full):
+    """
+    Copies a file without passing its bytes through Python: copy_file_range (which can
+    also share extents or copy server-side), then sendfile, then a chunked read/write loop.
+    """
+    with open(src_full, 'rb') as src, open(dst_full, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        for kernel_copy in (_copy_file_range, _sendfile):
+            try:
+                if kernel_copy(src.fileno(), dst.fileno(), size):
+                    return
+            except OSError as e:
+                if e.errno not in _NOT_SUPPORTED:
+                    raise
+            # Start over with the next method
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+
+def _copy_file_range(src_fd, dst_fd, size):
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK_SIZE * 16, size - copied))
+        if n == 0:
+            break
+        copied += n
+    return copied == size
+
+
+def _sendfile(src_fd, dst_fd, size):
+    if not hasattr(os, 'sendfile'):
+        return False
+    copied = 0
+    while copied < size:
+        n = os.sendfile(dst_fd, src_fd, copied, min(COPY_CHUNK_SIZE * 16, size - copied))
+        if n == 0:
+            break
+        copied += n
+    return copied == size
+
+
+def replace_file(src_full, dst_full):
+    """
+    Atomically replaces dst_full with a copy of src_full: the copy (a clone when
+    possible) is made next to the destination and renamed over it, so readers see
+    either the old or the new file, never a partial one.
+    """
+    temp_full = f"{dst_full}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        clone_file(src_full, temp_full)
+        os.replace(temp_full, dst_full)
+    finally:
+        if os.path.exists(temp_full):
+            os.remove(temp_full)
+
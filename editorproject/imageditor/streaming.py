@@ -0,0 +1,298 @@
+"""
+Bounded-memory, forward-only rendering of MoviePy clips.
+
+write_videofile pulls frames through MoviePy's random-access get_frame and hands each
+one straight to ffmpeg. render_clip instead walks the timeline strictly forward and
+runs three stages over a fixed pool of preallocated frame slots:
+
+    producer thread  --(read-ahead queue)-->  main loop  --(write-behind queue)-->  writer thread
+    decode + effects                          progress /                            ffmpeg stdin
+                                              cancellation
+
+Frames are copied into pool slots (effects may return reused buffers), so the pool holds
+(read_ahead + write_behind + 2) frames regardless of video length; the decoder's current
+frame and the effects' working copy come on top (see estimate_render_memory).
+
+Effects that remap time (Loop, MultiplySpeed) make get_frame seek backwards through the
+source. For those the caller passes `frames`, built with remapped_frames() from forward
+passes over the source, so the decoder never seeks backwards (each loop is one more pass).
+"""
+import os
+import queue
+import subprocess
+import threading
+
+import numpy as np
+import proglog
+from django.conf import settings
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+# Decoder, Python interpreter and MoviePy baseline per render, on top of the frame pool
+RENDER_BASE_OVERHEAD_BYTES = 200 * 1024 ** 2
+
+# Live preview streams are written under MEDIA_ROOT/PREVIEW_STREAM_DIR/<task id>/
+PREVIEW_STREAM_DIR = 'preview_streams'
+STREAM_PLAYLIST = 'index.m3u8'
+FASTSTART_EXTENSIONS = {'.mp4', '.m4v', '.mov'}
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def frame_pool_size(read_ahead, write_behind):
+    # +1 slot being filled by the producer, +1 being written by ffmpeg
+    return read_ahead + write_behind + 2
+
+
+def estimate_render_memory(width, height, read_ahead=None, write_behind=None):
+    """Upper bound of a streaming render's memory use, in bytes."""
+    read_ahead = settings.VIDEO_STREAM_READ_AHEAD if read_ahead is None else read_ahead
+    write_behind = settings.VIDEO_STREAM_WRITE_BEHIND if write_behind is None else write_behind
+    frame_bytes = width * height * 3
+    # The ffmpeg reader keeps its own last frame and the effects chain a working copy
+    return RENDER_BASE_OVERHEAD_BYTES + frame_bytes * (frame_pool_size(read_ahead, write_behind) + 2)
+
+
+def renders_fit_in_budget(budget_bytes=None, width=3840, height=2160):
+    """How many concurrent renders of the given resolution fit in the worker's memory budget."""
+    if budget_bytes is None:
+        budget_bytes = settings.VIDEO_WORKER_MEMORY_BUDGET_MB * 1024 ** 2
+    return max(1, budget_bytes // estimate_render_memory(width, height))
+
+
+def _tee_escape(path):
+    # Special characters of the tee muxer's output list
+    path = path.replace('\\', '/')
+    for char in ':|[]':
+        path = path.replace(char, '\\' + char)
+    return path
+
+
+def stream_output(filename, stream_dir, segment_seconds, ffmpeg_params=None, with_audio=False):
+    """
+    Output filename and ffmpeg params that write one encode twice (tee muxer): short
+    fragmented-MP4 HLS segments in stream_dir, playable while the render is running,
+    and the final file with its index moved to the front (faststart).
+    """
+    params = list(ffmpeg_params or [])
+    if "-map" not in params:
+        # The tee muxer needs explicit stream selection
+        params += ["-map", "0:v:0"] + (["-map", "1:a:0"] if with_audio else [])
+    params += [
+        # A keyframe at every segment boundary, so each segment can start playback
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+        # Codec headers in the container (not in-band), as both mp4 and fMP4 segments need
+        "-flags", "+global_header",
+        "-f", "tee",
+    ]
+
+    # onfail=ignore: a failing live stream (e.g. its directory was removed) must not abort the final file
+    hls = (f"[f=hls:hls_time={segment_seconds}:hls_playlist_type=event:hls_segment_type=fmp4:onfail=ignore]"
+           f"{_tee_escape(os.path.join(stream_dir, STREAM_PLAYLIST))}")
+    final = _tee_escape(filename)
+    if os.path.splitext(filename)[1].lower() in FASTSTART_EXTENSIONS:
+        final = f"[movflags=+faststart]{final}"
+    return f"{hls}|{final}", params
+
+
+def remapped_frames(source, fps, n_frames, source_index):
+    """
+    The n_frames frames of a time-remapped `source`, read forward: output frame i is
+    source frame source_index(i) (at `fps`), repeated or skipped as needed. An index
+    below the previous one (a loop wrapping around) starts a new pass from the start.
+    """
+    last_index = int(source.duration * fps) - 1
+    frames = None
+    position = -1
+    frame = None
+    for frame_index in range(n_frames):
+        wanted = min(source_index(frame_index), last_index)
+        if frames is None or wanted < position:
+            frames = source.iter_frames(fps=fps, dtype='uint8')
+            position = -1
+        while position < wanted:
+            frame = next(frames)
+            position += 1
+        yield frame
+
+
+def render_clip(clip, filename, codec="libx264", audio_codec="aac", preset="medium", threads=None,
+                pixel_format=None, ffmpeg_params=None, fps=None, temp_audiofile=None, logger=None,
+                read_ahead=None, write_behind=None, audio_source=None, stream_dir=None, segment_seconds=1,
+                frames=None):
+    """
+    Drop-in replacement for clip.write_videofile(...) with bounded memory.
+    `logger` receives the same "frame_index" progress bar as MoviePy's, so progress
+    reporting and cancellation hooks work unchanged.
+
+    When `audio_source` is given (a media file whose timeline matches the clip's),
+    its first audio stream is muxed as-is instead of decoding and re-encoding the
+    clip's audio.
+
+    When `stream_dir` is given, the same encode is also written there as an HLS
+    playlist (STREAM_PLAYLIST) of `segment_seconds` long segments, which grows as
+    the render progresses.
+
+    `frames`, when given, yields the clip's frames in order and is used instead of
+    clip.get_frame (see remapped_frames).
+    """
+    read_ahead = settings.VIDEO_STREAM_READ_AHEAD if read_ahead is None else read_ahead
+    write_behind = settings.VIDEO_STREAM_WRITE_BEHIND if write_behind is None else write_behind
+    fps = fps or clip.fps
+    logger = proglog.default_bar_logger(logger)
+
+    audiofile = None
+    if audio_source is not None and clip.audio is not None:
+        audiofile = audio_source
+        # Input 0 is the raw frame pipe, input 1 the source file: keep only its audio ("?": if any)
+        ffmpeg_params = ["-map", "0:v:0", "-map", "1:a:0?"] + list(ffmpeg_params or [])
+    elif clip.audio is not None:
+        audiofile = temp_audiofile or f"{os.path.splitext(filename)[0]}.audio.m4a"
+        clip.audio.write_audiofile(audiofile, fps=44100, codec=audio_codec, logger=None)
+
+    output = filename
+    if stream_dir is not None:
+        output, ffmpeg_params = stream_output(filename, stream_dir, segment_seconds, ffmpeg_params,
+                                              with_audio=audiofile is not None)
+    elif os.path.splitext(filename)[1].lower() in FASTSTART_EXTENSIONS:
+        # Index (moov) before the media data, so players can start and seek before the download ends
+        ffmpeg_params = list(ffmpeg_params or []) + ["-movflags", "+faststart"]
+
+    width, height = clip.size
+    n_frames = int(clip.duration * fps)
+    pool = [np.empty((height, width, 3), dtype=np.uint8)
+            for _ in range(frame_pool_size(read_ahead, write_behind))]
+    free_slots = queue.Queue()
+    for index in range(len(pool)):
+        free_slots.put(index)
+    ready = queue.Queue(maxsize=read_ahead)
+    to_write = queue.Queue(maxsize=write_behind)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for frame_index in range(n_frames):
+                slot = free_slots.get()
+                if slot is None or stop.is_set():
+                    return
+                frame = next(frames) if frames is not None else clip.get_frame(frame_index / fps)
+                np.copyto(pool[slot], frame[..., :3], casting='unsafe')
+                ready.put(slot)
+        except Exception as e:
+            ready.put(_StageError(e))
+
+    def write(writer):
+        while True:
+            slot = to_write.get()
+            if slot is _DONE:
+                return
+            if not write_error:
+                try:
+                    writer.write_frame(pool[slot])
+                except Exception as e:
+                    # Keep draining so the main loop never blocks on a full queue
+                    write_error.append(e)
+            free_slots.put(slot)
+
+    def shut_down_producer():
+        stop.set()
+        free_slots.put(None)  # Wake the producer if it is waiting for a slot
+        while producer.is_alive():
+            try:
+                ready.get_nowait()  # ... or waiting for room in the read-ahead queue
+            except queue.Empty:
+                pass
+            producer.join(timeout=0.05)
+
+    write_error = []
+    producer = threading.Thread(target=produce, name="render-read-ahead", daemon=True)
+
+    try:
+        with FFMPEG_VideoWriter(output, (width, height), fps, codec=codec, preset=preset,
+                                audiofile=audiofile, audio_codec="copy" if audiofile else None,
+                                threads=threads, ffmpeg_params=ffmpeg_params,
+                                pixel_format=pixel_format) as writer:
+            writer_thread = threading.Thread(target=write, args=(writer,), name="render-write-behind", daemon=True)
+            producer.start()
+            writer_thread.start()
+            try:
+                for _ in logger.iter_bar(frame_index=range(n_frames)):
+                    slot = ready.get()
+                    if isinstance(slot, _StageError):
+                        raise slot.exc
+                    if write_error:
+                        break
+                    to_write.put(slot)
+            finally:
+                shut_down_producer()
+                # Frames already handed over are still written unless the writer failed
+                to_write.put(_DONE)
+                writer_thread.join()
+
+        if write_error:
+            raise write_error[0]
+    finally:
+        if audiofile and audiofile != audio_source and os.path.exists(audiofile):
+            os.remove(audiofile)
+
+
+def is_faststart(full_path):
+    """
+    True when an MP4/MOV file's index (moov) comes before its media data (mdat).
+    Raises ValueError for a box smaller than its own header (a malformed file).
+    """
+    with open(full_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return True  # No mdat at all: nothing to reorder
+            size = int.from_bytes(header[:4], 'big')
+            box_type = header[4:]
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat':
+                return False
+            header_size = 8
+            if size == 1:
+                largesize = f.read(8)
+                if len(largesize) < 8:
+                    return True
+                size, header_size = int.from_bytes(largesize, 'big'), 16
+            elif size == 0:
+                return True  # Last box runs to the end of the file
+            if size < header_size:
+                # Would seek back into (or before) this box's header and loop forever
+                raise ValueError(f"Malformed {box_type!r} box of size {size} at offset {f.tell() - header_size}")
+            next_box = f.tell() + size - header_size
+            if next_box >= file_size:
+                return True  # Truncated or last box: no mdat after it
+            f.seek(next_box)
+
+
+def ensure_faststart(full_path):
+    """
+    Moves the moov atom of an MP4/MOV file to the front with a stream-copy remux
+    (no re-encode). Returns True if the file was rewritten.
+    """
+    if os.path.splitext(full_path)[1].lower() not in FASTSTART_EXTENSIONS or is_faststart(full_path):
+        return False
+
+    name, ext = os.path.splitext(full_path)
+    temp_path = f"{name}.faststart{ext}"
+    try:
+        subprocess.run(
+            [FFMPEG_BINARY, '-v', 'error', '-y', '-i', full_path, '-map', '0', '-c', 'copy',
+             '-movflags', '+faststart', temp_path],
+            capture_output=True, check=True,
+        )
+        os.replace(temp_path, full_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
@@ -1,35 +1,183 @@
+import os
+import shutil
 from celery import shared_task
+from celery.exceptions import Ignore
+from cloudinary.utils import random_public_id
 from moviepy import VideoFileClip
-from django.core.files.storage import default_storage
+from django.conf import settings
 from .config import EDITOR_TOOLS
-from .editors import videoEditors
+from . import encoding, media_gc, profile_uploads, render_cache, video_jobs
+from .media_storage import get_media_storage
+from .probe import probe_video
+from .progress import TaskProgressLogger, RenderCancelled
+from .streaming import render_clip, PREVIEW_STREAM_DIR, STREAM_PLAYLIST
+from .thumbnails import build_thumbnails
+from .models import UserEdit
 
 
 @shared_task(bind=True)
-def process_video_task(self, tool_key, options, working_path, preview_path):
+def process_video_task(self, tool_key, options, working_path, preview_path, cache_key=None, fingerprint=None,
+                       profile=encoding.DEFAULT_PROFILE):
     """
     Background task to process video optimized for speed.
+    When a cache_key is given, the finished render is added to the render cache.
+    When a fingerprint is given, the in-flight job lock is released once the task ends.
+    `profile` picks the encoder settings (see encoding.ENCODING_PROFILES).
+
+    The render goes to a temporary file that only replaces the preview once complete,
+    so a cancelled or superseded job never overwrites a newer preview.
     """
-    input_full_path = default_storage.path(working_path)
-    output_full_path = default_storage.path(preview_path)
+    task_id = self.request.id
+    temp_output_path = None
+    temp_audio_path = None
+    stream_dir = None
+
+    try:
+        if video_jobs.is_cancelled(task_id):
+            raise RenderCancelled(task_id)
+
+        storage = get_media_storage()
+
+        tool_config = EDITOR_TOOLS.get(tool_key)
+        if tool_config is None:
+            raise ValueError(f"Tool '{tool_key}' not found in EDITOR_TOOLS. Available: {list(EDITOR_TOOLS.keys())}")
+
+        editor_instance = tool_config["editor_class"]()
+        # OPTIMIZATION: Preset/CRF/tune per output type, threads split across concurrent renders
+        encoder_settings = encoding.encoder_settings(profile)
+
+        temp_output_path = storage.temp_path(preview_path)
+        temp_audio_path = f"{os.path.splitext(temp_output_path)[0]}_audio.m4a"
+
+        # OPTIMIZATION: Previews are also streamed as short HLS segments, so the browser can
+        # start playing within a segment of the render starting instead of after the whole encode
+        logger_options = {}
+        # (only when MEDIA_ROOT is what MEDIA_URL serves, i.e. the local media storage)
+        if profile == "preview" and settings.VIDEO_PREVIEW_STREAMING and storage.is_local:
+            stream_path = os.path.join(PREVIEW_STREAM_DIR, task_id)
+            stream_dir = os.path.join(settings.MEDIA_ROOT, stream_path)
+            os.makedirs(stream_dir, exist_ok=True)
+            logger_options = {
+                "stream_playlist": os.path.join(stream_dir, STREAM_PLAYLIST),
+                "stream_url": settings.MEDIA_URL + f"{PREVIEW_STREAM_DIR}/{task_id}/{STREAM_PLAYLIST}",
+            }
+
+        with storage.local_path(working_path) as input_full_path, VideoFileClip(input_full_path) as video:
+            edited = editor_instance.edit(video, **options)
+
+            # OPTIMIZATION: Tools that leave the audio alone get the original stream copied
+            # into the output (-c:a copy) instead of an AAC decode + re-encode
+            modifies_audio = getattr(editor_instance, "MODIFIES_AUDIO", False)
+            has_audio = probe_video(input_full_path)["audio_codec"] is not None
+            audio_source = input_full_path if has_audio and not modifies_audio else None
+
+            # Loop/Speed remap time: their frames come from forward passes over the source
+            frames = None
+            if edited is not video and hasattr(editor_instance, "frames"):
+                frames = editor_instance.frames(video, edited, edited.fps, **options)
+
+            # Frames done / total / fps / ETA are published as the task's PROGRESS state;
+            # the same per-frame hook aborts the render once the task is cancelled.
+            # OPTIMIZATION: Forward-only streaming render keeps worker memory bounded on long videos
+            render_clip(
+                edited,
+                temp_output_path,
+                temp_audiofile=temp_audio_path,
+                logger=TaskProgressLogger(self, **logger_options),
+                audio_source=audio_source,
+                stream_dir=stream_dir,
+                segment_seconds=settings.VIDEO_STREAM_SEGMENT_SECONDS,
+                frames=frames,
+                **encoder_settings
+            )
 
-    tool_config = EDITOR_TOOLS.get(tool_key)
-    if tool_config is None:
-        raise ValueError(f"Tool '{tool_key}' not found in EDITOR_TOOLS. Available: {list(EDITOR_TOOLS.keys())}")
+        # Cancelled or superseded while the last frames were encoding: keep the newer preview
+        if video_jobs.is_cancelled(task_id):
+            raise RenderCancelled(task_id)
 
-    editor_instance = tool_config["editor_class"]()
+        # OPTIMIZATION: Hashed here rather than in a request: once this preview is committed
+        # as the working file, preview_video finds its hash (shared through Redis) for the
+        # render cache key. Moving the file into place keeps its identity
+        render_cache.content_hash(temp_output_path)
 
-    with VideoFileClip(input_full_path) as video:
-        edited = editor_instance.edit(video, **options)
+        storage.save_from(temp_output_path, preview_path)
+        media_gc.touch(preview_path)
 
+        if cache_key:
+            with storage.local_path(preview_path) as output_full_path:
+                render_cache.store(cache_key, output_full_path)
 
-        edited.write_videofile(
-            output_full_path,
-            codec="libx264",
-            audio_codec="aac",
-            pixel_format="yuv420p",
-            preset="ultrafast",
-            threads=4,
+        result = {"status": "Complete", "preview_path": preview_path}
+        video_jobs.publish_task_event(task_id, 'SUCCESS', result)
+        return result
+    except RenderCancelled:
+        print(f"[Video Task] ⏹️ Render {task_id} cancelled, discarding partial output.")
+        self.update_state(state='REVOKED')
+        video_jobs.publish_task_event(task_id, 'REVOKED')
+        raise Ignore()
+    except Exception as e:
+        video_jobs.publish_task_event(task_id, 'FAILURE', e)
+        raise
+    finally:
+        for partial_path in (temp_output_path, temp_audio_path):
+            if partial_path and os.path.exists(partial_path):
+                os.remove(partial_path)
+        if stream_dir:
+            # The client switches to the finished preview file on SUCCESS
+            shutil.rmtree(stream_dir, ignore_errors=True)
+        if fingerprint:
+            video_jobs.release_job(fingerprint, task_id)
+
+
+@shared_task
+def generate_video_thumbnails(video_path, sprite_path, poster_path, index_path):
+    """
+    Builds the editor's timeline sprite sheet, poster frame and JSON index for an upload.
+    The frontend polls for the index file, so only the paths go back as the result.
+    """
+    build_thumbnails(video_path, sprite_path, poster_path, index_path)
+    return {"status": "Complete", "index_path": index_path}
+
+
+@shared_task
+def collect_temp_media():
+    """Periodic (Celery beat) garbage collection of temporary media; see media_gc."""
+    deleted, freed = media_gc.collect()
+    return {"deleted": deleted, "freed_bytes": freed}
+
+
+@shared_task(bind=True)
+def upload_to_profile_task(self, user_id, file_path, media_type, public_id, upload_id=None, offset=0):
+    """
+    Uploads a snapshot of a finished edit (see profile_uploads) to Cloudinary and adds it
+    to the user's profile. Retries resume at the chunk that failed, after a backoff.
+    """
+    upload_id = upload_id or random_public_id()
+    try:
+        with get_media_storage().local_path(file_path) as full_path:
+            result = profile_uploads.upload_from(
+                full_path,
+                upload_id,
+                offset,
+                folder="edits/",
+                resource_type="auto",
+                public_id=public_id,
+            )
+    except profile_uploads.UploadInterrupted as e:
+        if self.request.retries >= settings.PROFILE_UPLOAD_MAX_RETRIES:
+            profile_uploads.discard_snapshot(file_path)
+            raise
+        countdown = profile_uploads.retry_countdown(self.request.retries)
+        print(f"[Profile Upload] 🔁 {e}; retrying in {countdown}s")
+        raise self.retry(
+            kwargs={**self.request.kwargs, "upload_id": upload_id, "offset": e.offset},
+            countdown=countdown,
+            max_retries=settings.PROFILE_UPLOAD_MAX_RETRIES,
         )
+    except Exception:
+        profile_uploads.discard_snapshot(file_path)
+        raise
 
-    return {"status": "Complete", "preview_path": preview_path}
\ No newline at end of file
+    edit = UserEdit.objects.create(user_id=user_id, media_type=media_type, edited_file=result.get('secure_url'))
+    profile_uploads.discard_snapshot(file_path)
+    return {"status": "Complete", "url": result.get('secure_url'), "edit_id": edit.pk}
@@ -1,3 +1,756 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import cloudinary
+import fakeredis
+import numpy as np
+from PIL import Image
+from celery import current_app
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from moviepy import ImageClip, VideoFileClip, vfx
+from moviepy.config import FFMPEG_BINARY
+
+from . import blob_store, media_gc, media_storage, render_cache, uploads, views
+from .editors.color import ColorTransform
+from .editors.videoEditors import VideoLoopEditor, VideoSpeedEditor
+from .models import MediaSession, UserEdit
+from .streaming import PREVIEW_STREAM_DIR, is_faststart, render_clip
+from .tasks import process_video_task, upload_to_profile_task
+
+
+def setUpModule():
+    # imageditor ships without migration files; create its tables in the test database
+    with connection.schema_editor() as editor:
+        for model in (UserEdit, MediaSession):
+            if model._meta.db_table not in connection.introspection.table_names():
+                editor.create_model(model)
+
+
+class MediaTestCase(TestCase):
+    """Runs each test against an empty temporary MEDIA_ROOT, without the Redis-backed media_gc index."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        # No Redis in tests: media_gc bookkeeping is skipped
+        for name in ('touch', 'forget'):
+            original = getattr(media_gc, name)
+            setattr(media_gc, name, lambda *paths: None)
+            self.addCleanup(setattr, media_gc, name, original)
+
+
+class FakeCloudinary(ThreadingHTTPServer):
+    """
+    Local stand-in for Cloudinary's chunked upload API: reassembles the parts of each
+    X-Unique-Upload-Id and answers the last one with an upload result. `failures` is a
+    list of (content range start, HTTP status) to answer once instead of accepting the part.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeCloudinaryHandler)
+        self.uploads = {}
+        self.requests = []
+        self.failures = []
+        self.lock = threading.Lock()
+
+
+class FakeCloudinaryHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        start, end, total = (int(v) for v in re.match(
+            r'bytes (\d+)-(\d+)/(\d+)', self.headers['Content-Range']).groups())
+        upload_id = self.headers['X-Unique-Upload-Id']
+
+        with server.lock:
+            server.requests.append((upload_id, start, end, total, self.path))
+            for failure in list(server.failures):
+                if failure[0] == start:
+                    server.failures.remove(failure)
+                    return self._answer(failure[1], {"error": {"message": "Injected failure"}})
+
+            # The part is the "file" field of a multipart/form-data body
+            boundary = self.headers['Content-Type'].split('boundary=')[1].encode()
+            for part in body.split(b'--' + boundary):
+                if b'name="file"' in part:
+                    data = part.split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n', 1)[0]
+                    server.uploads.setdefault(upload_id, {})[start] = data
+
+            public_id = re.search(rb'name="public_id"\r\n\r\n([^\r]*)', body).group(1).decode()
+            received = sum(len(d) for d in server.uploads[upload_id].values())
+
+        result = {"public_id": public_id}
+        if received == total:
+            result["secure_url"] = f"https://res.example.com/{public_id}"
+        self._answer(200, result)
+
+    def _answer(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@override_settings(
+    PROFILE_UPLOAD_CHUNK_SIZE=1000,
+    PROFILE_UPLOAD_MAX_RETRIES=2,
+    PROFILE_UPLOAD_RETRY_BACKOFF=0,
+)
+class ProfileUploadTests(MediaTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeCloudinary()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.server.uploads.clear()
+        self.server.requests.clear()
+        self.server.failures.clear()
+
+        self.previous_config = cloudinary.config().__dict__.copy()
+        cloudinary.config(
+            cloud_name='test-cloud', api_key='key', api_secret='secret',
+            upload_prefix=f"http://127.0.0.1:{self.server.server_port}",
+        )
+        self.addCleanup(lambda: cloudinary.config().__dict__.update(self.previous_config))
+
+        # No Redis in tests: tasks run inline
+        self.previous_eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', self.previous_eager)
+
+        self.user = User.objects.create_user('editor', password='pass')
+        self.content = os.urandom(2500)
+        self.file_path = default_storage.save('profile_uploads/job.mp4', ContentFile(self.content))
+
+    def run_task(self):
+        return upload_to_profile_task.apply(args=[self.user.pk, self.file_path, 'video', 'edit_test'])
+
+    def uploaded_bytes(self):
+        (parts,) = self.server.uploads.values()
+        return b''.join(parts[start] for start in sorted(parts))
+
+    def test_uploads_file_in_chunks_and_creates_edit(self):
+        result = self.run_task()
+
+        self.assertEqual(result.status, 'SUCCESS')
+        self.assertEqual(result.result['url'], 'https://res.example.com/edit_test')
+        self.assertEqual(self.uploaded_bytes(), self.content)
+        self.assertEqual([(r[1], r[2]) for r in self.server.requests], [(0, 999), (1000, 1999), (2000, 2499)])
+        self.assertEqual(len({r[0] for r in self.server.requests}), 1)  # One X-Unique-Upload-Id
+        self.assertTrue(self.server.requests[0][4].endswith('/test-cloud/auto/upload'))
+
+        edit = UserEdit.objects.get(user=self.user)
+        self.assertEqual(edit.media_type, 'video')
+        self.assertFalse(default_storage.exists(self.file_path))
+
+    def test_retry_resumes_at_failed_chunk(self):
+        self.server.failures = [(1000, 500), (1000, 503)]
+
+        self.run_task()
+
+        starts = [r[1] for r in self.server.requests]
+        self.assertEqual(starts, [0, 1000, 1000, 1000, 2000])  # Chunk 0 is not sent again
+        self.assertEqual(len({r[0] for r in self.server.requests}), 1)
+        self.assertEqual(self.uploaded_bytes(), self.content)
+        self.assertEqual(UserEdit.objects.filter(user=self.user).count(), 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.failures = [(0, 500)] * 3
+
+        result = self.run_task()
+
+        self.assertEqual(result.status, 'FAILURE')
+        self.assertFalse(UserEdit.objects.exists())
+        self.assertFalse(default_storage.exists(self.file_path))
+
+    def test_permanent_error_is_not_retried(self):
+        self.server.failures = [(0, 401)]
+
+        result = self.run_task()
+
+        self.assertEqual(result.status, 'FAILURE')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertFalse(UserEdit.objects.exists())
+
+    def test_save_to_profile_returns_job_id(self):
+        working_path = default_storage.save('temp_edited_images/working_abc.mp4', ContentFile(self.content))
+        self.client.force_login(self.user)
+
+        response = self.client.post('/api/save-to-profile/', {
+            'working_file_path': working_path,
+            'media_type': 'video',
+        })
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['job_id'])
+        self.assertEqual(UserEdit.objects.filter(user=self.user).count(), 1)
+        self.assertTrue(default_storage.exists(working_path))
+        self.assertEqual(self.uploaded_bytes(), self.content)
+
+
+class FakeObjectStore(ThreadingHTTPServer):
+    """Local stand-in for an HTTP object store: GET / PUT / HEAD / DELETE with ETags."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeObjectStoreHandler)
+        self.objects = {}
+        self.requests = []
+        self.versions = 0
+        self.send_etags = True
+
+    def put(self, key, data):
+        self.versions += 1
+        self.objects[key] = (data, f'"v{self.versions}"')
+
+
+class FakeObjectStoreHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _key(self):
+        self.server.requests.append((self.command, self.path))
+        return self.path.split('/store/', 1)[1]
+
+    def _send(self, status, data=b'', etag=None, body=True):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        if etag and self.server.send_etags:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        data, etag = self.server.objects.get(self._key(), (None, None))
+        if data is None:
+            return self._send(404, body=False)
+        self._send(200, data, etag, body=False)
+
+    def do_GET(self):
+        data, etag = self.server.objects.get(self._key(), (None, None))
+        if data is None:
+            return self._send(404)
+        self._send(200, data, etag)
+
+    def do_PUT(self):
+        self.server.put(self._key(), self.rfile.read(int(self.headers['Content-Length'])))
+        self._send(201)
+
+    def do_DELETE(self):
+        self._send(204 if self.server.objects.pop(self._key(), None) else 404)
+
+
+class HTTPMediaStorageTests(MediaTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeObjectStore()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.server.objects.clear()
+        self.server.requests.clear()
+        self.server.send_etags = True
+
+        self.storage = self.new_node()
+        self.addCleanup(setattr, media_storage, '_media_storage', media_storage._media_storage)
+        media_storage._media_storage = self.storage
+
+    def new_node(self):
+        """A storage with its own cache, like another web or worker node."""
+        cache = media_storage.ReadThroughCache(tempfile.mkdtemp(dir=self.media_root), 10 ** 6)
+        return media_storage.HTTPMediaStorage(
+            f"http://127.0.0.1:{self.server.server_port}/store/", token='secret', cache=cache,
+        )
+
+    def gets(self):
+        return [path for method, path in self.server.requests if method == 'GET']
+
+    def test_written_file_is_read_from_cache_until_it_changes(self):
+        self.storage.save_bytes(b'first', 'temp_edited_images/working_a.png')
+        self.assertEqual(self.server.objects['temp_edited_images/working_a.png'][0], b'first')
+
+        with self.storage.open('temp_edited_images/working_a.png') as f:
+            self.assertEqual(f.read(), b'first')
+        self.assertEqual(self.gets(), [])  # Seeded by the write
+
+        # Another node replaces it: the ETag no longer matches and the file is fetched again
+        self.new_node().save_bytes(b'second', 'temp_edited_images/working_a.png')
+        with self.storage.local_path('temp_edited_images/working_a.png') as full_path:
+            with open(full_path, 'rb') as f:
+                self.assertEqual(f.read(), b'second')
+        self.assertEqual(len(self.gets()), 1)
+
+    def test_copy_delete_and_missing_files(self):
+        other = self.new_node()
+        other.save_bytes(b'image', 'temp_edited_images/preview_a.png')
+
+        self.storage.copy('temp_edited_images/preview_a.png', 'temp_edited_images/working_a.png')
+        self.assertEqual(self.server.objects['temp_edited_images/working_a.png'][0], b'image')
+
+        self.storage.delete('temp_edited_images/working_a.png')
+        self.assertFalse(self.storage.exists('temp_edited_images/working_a.png'))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open('temp_edited_images/working_a.png')
+
+    def test_sizes_come_from_the_store(self):
+        self.storage.save_bytes(b'12345', 'temp_edited_images/working_a.mp4')
+        self.storage.save_bytes(b'123', 'temp_edited_images/preview_a.mp4')
+
+        self.assertEqual(self.storage.size('temp_edited_images/working_a.mp4'), 5)
+        self.assertEqual(media_gc.disk_usage(['temp_edited_images/working_a.mp4', 'temp_edited_images/preview_a.mp4',
+                                              'temp_edited_images/missing.mp4']), 8)
+
+    @override_settings(MEDIA_DOWNLOAD_OFFLOAD='x-sendfile')
+    def test_x_sendfile_is_not_used_for_remote_files(self):
+        self.server.send_etags = False  # Uncacheable: the local copy is deleted right away
+        self.storage.save_bytes(b'video', 'temp_edited_images/working_a.mp4')
+
+        response = self.client.get('/api/download-video/', {'file_path': 'temp_edited_images/working_a.mp4'})
+
+        self.assertNotIn('X-Sendfile', response)
+        self.assertEqual(b''.join(response.streaming_content), b'video')
+
+    def test_unversioned_download_is_removed_after_use(self):
+        self.server.send_etags = False
+        self.storage.save_bytes(b'data', 'temp_edited_images/working_a.png')
+
+        with self.storage.local_path('temp_edited_images/working_a.png') as full_path:
+            with open(full_path, 'rb') as f:
+                self.assertEqual(f.read(), b'data')
+        self.assertFalse(os.path.exists(full_path))
+        self.assertEqual(os.listdir(os.path.join(self.storage.cache.directory, 'tmp')), [])
+
+    def test_commit_view_uses_object_store(self):
+        for name, color in (('working', 'red'), ('preview', 'blue')):
+            output = io.BytesIO()
+            Image.new('RGB', (4, 3), color).save(output, 'PNG')
+            self.new_node().save_bytes(output.getvalue(), f'temp_edited_images/{name}_a.png')
+
+        response = self.client.post('/api/process/', {
+            'working_file_path': 'temp_edited_images/working_a.png',
+            'preview_file_path': 'temp_edited_images/preview_a.png',
+        })
+
+        self.assertEqual(response.json()['new_width'], 4)
+        working = Image.open(io.BytesIO(self.server.objects['temp_edited_images/working_a.png'][0]))
+        self.assertEqual(working.getpixel((0, 0)), (0, 0, 255))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'temp_edited_images')))
+
+
+class DownloadOffloadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.video_path = default_storage.save('temp_edited_images/working_a b.mp4', ContentFile(b'0123456789'))
+
+    def download(self, **headers):
+        return self.client.get('/api/download-video/', {'file_path': self.video_path}, **headers)
+
+    @override_settings(MEDIA_DOWNLOAD_OFFLOAD='x-accel-redirect', MEDIA_DOWNLOAD_ACCEL_PREFIX='/protected-media/')
+    def test_x_accel_redirect(self):
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/temp_edited_images/working_a%20b.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_DOWNLOAD_OFFLOAD='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.download()
+
+        self.assertEqual(response['X-Sendfile'], default_storage.path(self.video_path))
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_DOWNLOAD_OFFLOAD='x-accel-redirect')
+    def test_checks_stay_in_django(self):
+        response = self.client.get('/api/download-video/', {'file_path': 'temp_edited_images/missing.mp4'})
+        self.assertNotIn('X-Accel-Redirect', response)
+
+        response = self.client.get('/api/download-video/', {'file_path': '../settings.py'})
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_streams_with_range_support_by_default(self):
+        response = self.download(HTTP_RANGE='bytes=2-4')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+
+    def test_invalid_range_is_ignored_and_range_past_end_is_unsatisfiable(self):
+        response = self.download(HTTP_RANGE='bytes=5-3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+        self.assertEqual(self.download(HTTP_RANGE='bytes=10-').status_code, 416)
+
+    def test_malformed_mp4_boxes_do_not_hang_faststart_check(self):
+        path = os.path.join(self.media_root, 'malformed.mp4')
+        for header in (b'\x00\x00\x00\x01free' + bytes(8),  # 64-bit size of 0
+                       b'\x00\x00\x00\x04free'):               # 32-bit size below the header
+            with open(path, 'wb') as f:
+                f.write(header + bytes(96 - len(header)))
+            with self.assertRaises(ValueError):
+                is_faststart(path)
+
+        # A box running past the end of the file ends the scan
+        with open(path, 'wb') as f:
+            f.write(b'\x00\x00\x10\x00free' + bytes(88))
+        self.assertTrue(is_faststart(path))
+
+
+class TaskEventsTests(TestCase):
+    def test_wsgi_requests_are_told_to_poll(self):
+        # The test client is a WSGI request: the stream would only arrive once the task ended
+        response = self.client.get('/api/task-events/abc/')
+
+        self.assertEqual(response.status_code, 204)
+
+
+class ChunkedUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        # Upload metadata lives in Redis; an in-process fake stands in for it
+        patcher = mock.patch.object(uploads, 'get_redis', return_value=fakeredis.FakeRedis(decode_responses=True))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.video = os.urandom(1000)
+
+    def start(self):
+        response = self.client.post('/api/video-upload/start/', {'filename': 'clip.mp4', 'size': len(self.video)})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['upload_id']
+
+    def put(self, upload_id, start, end, body=None, total=None):
+        return self.client.put(
+            f'/api/video-upload/{upload_id}/', self.video[start:end + 1] if body is None else body,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.video) if total is None else total}',
+        )
+
+    def received(self, upload_id):
+        return self.client.get(f'/api/video-upload/{upload_id}/').json()['received']
+
+    def test_chunks_are_written_in_place(self):
+        upload_id = self.start()
+        half = len(self.video) // 2
+        self.assertEqual(self.put(upload_id, 0, half - 1).json()['received'], half)
+        self.assertEqual(self.received(upload_id), half)
+        self.assertEqual(self.put(upload_id, half, len(self.video) - 1).json()['received'], len(self.video))
+        with open(uploads.get_upload(upload_id)['full_path'], 'rb') as f:
+            self.assertEqual(f.read(), self.video)
+
+    def test_out_of_order_chunk_is_rejected(self):
+        upload_id = self.start()
+        response = self.put(upload_id, 100, 199)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.received(upload_id), 0)
+
+    def test_short_chunk_keeps_what_arrived(self):
+        upload_id = self.start()
+        # The body stops 50 bytes before the end its Content-Range announces
+        response = self.put(upload_id, 0, 199, body=self.video[:150])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.received(upload_id), 150)
+        # The client resumes from the reported offset
+        self.assertEqual(self.put(upload_id, 150, 199).status_code, 200)
+        self.assertEqual(self.received(upload_id), 200)
+
+    def test_size_mismatch_is_rejected(self):
+        upload_id = self.start()
+        response = self.put(upload_id, 0, 99, total=len(self.video) + 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.received(upload_id), 0)
+
+    def test_incomplete_upload_is_not_finalized(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, 99)
+        response = self.client.post(f'/api/video-upload/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 409)
+        # Still resumable
+        self.assertEqual(self.received(upload_id), 100)
+
+
+class MediaGCTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        # The index lives in Redis; an in-process fake stands in for it
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch.object(media_gc, 'get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.makedirs(os.path.join(self.media_root, 'temp_edited_images'))
+
+    def session(self, session_id, size, age):
+        """Writes a session's files (size bytes in all) and records them as used age seconds ago."""
+        paths = [f'temp_edited_images/{kind}_{session_id}.mp4' for kind in ('original', 'working')]
+        for path in paths:
+            with open(default_storage.path(path), 'wb') as f:
+                f.write(b'\0' * (size // len(paths)))
+        media_gc._register(self.redis, {f'session:{session_id}': set(paths)}, time.time() - age)
+        return paths
+
+    def test_expired_groups_are_deleted(self):
+        expired = self.session('old', 100, age=2 * 3600)
+        fresh = self.session('new', 100, age=60)
+
+        self.assertEqual(media_gc.collect(ttl=3600, max_bytes=10 ** 9, min_age=600), (1, 100))
+        self.assertFalse(any(default_storage.exists(path) for path in expired))
+        self.assertTrue(all(default_storage.exists(path) for path in fresh))
+        self.assertEqual(self.redis.zrange(media_gc.ACCESS_KEY, 0, -1), ['session:new'])
+        self.assertFalse(self.redis.exists(media_gc.FILES_PREFIX + 'session:old'))
+
+    def test_budget_evicts_least_recently_used_but_spares_recent_groups(self):
+        oldest = self.session('a', 300, age=3 * 600)
+        older = self.session('b', 300, age=2 * 600)
+        active = self.session('c', 500, age=60)
+
+        # Over budget even after evicting everything old enough: the active session stays
+        self.assertEqual(media_gc.collect(ttl=3600, max_bytes=400, min_age=600), (2, 600))
+        self.assertFalse(any(default_storage.exists(path) for path in oldest + older))
+        self.assertTrue(all(default_storage.exists(path) for path in active))
+        self.assertEqual(self.redis.hgetall(media_gc.BYTES_KEY), {'session:c': '500'})
+
+    def test_budget_stops_once_within_limit(self):
+        oldest = self.session('a', 300, age=3 * 600)
+        older = self.session('b', 300, age=2 * 600)
+
+        self.assertEqual(media_gc.collect(ttl=3600, max_bytes=400, min_age=600), (1, 300))
+        self.assertFalse(any(default_storage.exists(path) for path in oldest))
+        self.assertTrue(all(default_storage.exists(path) for path in older))
+
+
+class MediaVersionTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+
+        for name, color in (('working', 'red'), ('preview', 'blue')):
+            output = io.BytesIO()
+            Image.new('RGB', (4, 3), color).save(output, 'PNG')
+            default_storage.save(f'temp_edited_images/{name}_a.png', ContentFile(output.getvalue()))
+
+    def commit(self):
+        return self.client.post('/api/process/', {
+            'working_file_path': 'temp_edited_images/working_a.png',
+            'preview_file_path': 'temp_edited_images/preview_a.png',
+        }).json()['version_url']
+
+    def test_committed_version_is_served_immutable(self):
+        url = self.commit()
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        content = b''.join(response.streaming_content)
+        with default_storage.open('temp_edited_images/preview_a.png') as f:
+            self.assertEqual(content, f.read())
+
+    @override_settings(MEDIA_VERSION_MAX_AGE=365 * 24 * 60 * 60, MEDIA_TTL_SECONDS=24 * 60 * 60)
+    def test_cache_lifetime_does_not_outlive_the_version(self):
+        response = self.client.get(self.commit())
+
+        self.assertIn(f'max-age={24 * 60 * 60},', response['Cache-Control'])
+
+    def test_versions_are_not_served_without_signature(self):
+        name = self.commit().split('/media-versions/')[1].split('/', 1)[1]
+
+        for path in (f'versions/{name}', f'./versions/{name}', f'temp_edited_images/../versions/{name}'):
+            with self.assertRaises(Http404):
+                views.serve_media(RequestFactory().get('/media/' + path), path)
+
+    def test_same_content_gets_the_same_url(self):
+        self.assertEqual(self.commit(), self.commit())
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'versions'))), 1)
+
+    def test_signature_is_checked(self):
+        url = self.commit()
+        signature, name = url.split('/media-versions/')[1].split('/', 1)
+
+        self.assertEqual(self.client.get(f'/media-versions/{signature[:-1]}x/{name}').status_code, 404)
+        other = name[:3] + ('0' if name[3] != '0' else '1') + name[4:]
+        self.assertEqual(self.client.get(f'/media-versions/{signature}/{other}').status_code, 404)
+
+    def test_rewritten_blob_keeps_its_content_digest(self):
+        def rewrite(full_path):
+            with open(full_path, 'ab') as f:
+                f.write(b'-remuxed')
+            return True
+
+        results = []
+        for _ in range(2):
+            upload = os.path.join(self.media_root, 'upload.mp4')
+            with open(upload, 'wb') as f:
+                f.write(b'video')
+            results.append(blob_store.adopt_file(upload, None, 'mp4', prepare=rewrite))
+
+        expected = hashlib.sha256(b'video-remuxed').hexdigest()
+        self.assertEqual(results[0], (blob_store.blob_path(hashlib.sha256(b'video').hexdigest(), 'mp4'), expected))
+        self.assertEqual(results[1], results[0])  # Reused, with the digest of the remuxed bytes
+
+    def test_reusing_a_blob_leaves_its_session_links_unchanged(self):
+        upload = os.path.join(self.media_root, 'upload.mp4')
+        with open(upload, 'wb') as f:
+            f.write(b'video')
+        path, _ = blob_store.adopt_file(upload, None, 'mp4')
+        session_file = os.path.join(self.media_root, 'working_a.mp4')
+        os.link(default_storage.path(path), session_file)
+        os.utime(session_file, ns=(0, 0))
+
+        with open(upload, 'wb') as f:
+            f.write(b'video')
+        blob_store.adopt_file(upload, None, 'mp4')
+
+        self.assertEqual(os.stat(session_file).st_mtime_ns, 0)
+
+
+class VideoRenderTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.working_path = 'temp_edited_images/working_a.mp4'
+        self.preview_path = 'temp_edited_images/preview_a.mp4'
+        os.makedirs(os.path.join(self.media_root, 'temp_edited_images'))
+        # One second of 64x48 test pattern with a tone
+        subprocess.run([
+            FFMPEG_BINARY, '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=64x48:rate=10',
+            '-f', 'lavfi', '-i', 'sine', '-t', '1', '-pix_fmt', 'yuv420p', '-c:v', 'libx264', '-c:a', 'aac',
+            default_storage.path(self.working_path),
+        ], check=True)
+        shutil.copyfile(default_storage.path(self.working_path), default_storage.path(self.preview_path))
+
+    def render(self, profile, tool='video_mirror', options=None):
+        # The progress states would go to the Redis result backend
+        with mock.patch.object(process_video_task, 'update_state'):
+            return process_video_task.apply(
+                args=[tool, options or {'horizontal': True}, self.working_path, self.preview_path],
+                kwargs={'profile': profile},
+            )
+
+    @override_settings(VIDEO_PREVIEW_STREAMING=True)
+    def test_preview_render_replaces_preview(self):
+        before = os.stat(default_storage.path(self.preview_path)).st_ino
+
+        result = self.render('preview')
+
+        self.assertEqual(result.status, 'SUCCESS', result.traceback)
+        self.assertNotEqual(os.stat(default_storage.path(self.preview_path)).st_ino, before)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, 'temp_edited_images'))),
+                         ['preview_a.mp4', 'working_a.mp4'])  # No partial files left behind
+        self.assertEqual(os.listdir(os.path.join(self.media_root, PREVIEW_STREAM_DIR)), [])
+
+    def test_export_render(self):
+        result = self.render('export')
+
+        self.assertEqual(result.status, 'SUCCESS', result.traceback)
+
+    def test_committed_render_is_not_hashed_again(self):
+        shared = fakeredis.FakeRedis(decode_responses=True)
+        with mock.patch.object(render_cache, 'get_redis', return_value=shared):
+            self.assertEqual(self.render('preview').status, 'SUCCESS')
+            self.client.post('/api/process-video/', {
+                'working_file_path': self.working_path, 'preview_file_path': self.preview_path,
+            })
+
+            render_cache._known_hashes.clear()  # As in another web process
+            working_full_path = default_storage.path(self.working_path)
+            with mock.patch.object(render_cache, '_hash_file') as hash_file:
+                digest = render_cache.content_hash(working_full_path)
+
+        hash_file.assert_not_called()
+        with open(working_full_path, 'rb') as f:
+            self.assertEqual(digest, hashlib.sha256(f.read()).hexdigest())
+
+    def test_cache_hit_leaves_linked_preview_unchanged(self):
+        preview_full_path = default_storage.path(self.preview_path)
+        os.utime(preview_full_path, ns=(0, 0))
+        with mock.patch.object(render_cache, 'get_redis', return_value=fakeredis.FakeRedis()):
+            render_cache.store('k', preview_full_path)
+
+        self.assertTrue(render_cache.lookup('k'))
+        self.assertEqual(os.stat(preview_full_path).st_mtime_ns, 0)
+
+    def test_looped_render(self):
+        result = self.render('export', 'video_loop', {'n': 2})
+
+        self.assertEqual(result.status, 'SUCCESS', result.traceback)
+        with VideoFileClip(default_storage.path(self.preview_path)) as preview:
+            self.assertAlmostEqual(preview.duration, 2.0, delta=0.2)
+
+    def test_failing_live_stream_does_not_abort_render(self):
+        output = os.path.join(self.media_root, 'out.mp4')
+        stream_dir = os.path.join(self.media_root, 'stream')
+        # The second segment can't be written, after the live stream has started
+        os.makedirs(os.path.join(stream_dir, 'index1.m4s'))
+        with VideoFileClip(default_storage.path(self.working_path)) as video:
+            render_clip(video, output, stream_dir=stream_dir, segment_seconds=0.5, preset='ultrafast')
+
+        with VideoFileClip(output) as rendered:
+            self.assertAlmostEqual(rendered.duration, 1.0, delta=0.2)
+
+    def test_time_remapped_frames_match_random_access(self):
+        cases = [(VideoLoopEditor(), {'n': 2}), (VideoSpeedEditor(), {'factor': 2.0}),
+                 (VideoSpeedEditor(), {'factor': 0.5})]
+        with VideoFileClip(default_storage.path(self.working_path)) as video:
+            for editor, options in cases:
+                with self.subTest(editor=type(editor).__name__, **options):
+                    edited = editor.edit(video, **options)
+                    fps = edited.fps
+                    expected = [edited.get_frame(i / fps) for i in range(int(edited.duration * fps))]
+                    frames = list(editor.frames(video, edited, fps, **options))
+                    self.assertEqual(len(frames), len(expected))
+                    for frame, expected_frame in zip(frames, expected):
+                        self.assertTrue((frame == expected_frame).all())
+
+    def test_grayscale_matches_moviepy(self):
+        frame = np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+        clip = ImageClip(frame, duration=0.1)
+        for weights in ([1, 1, 1], [0.2125, 0.7154, 0.0721]):
+            with self.subTest(weights=weights):
+                expected = vfx.BlackAndWhite(RGB=weights).apply(clip).get_frame(0)
+                gray = ColorTransform().grayscale(weights).transform_frame(frame)
+                self.assertTrue((gray == expected).all())
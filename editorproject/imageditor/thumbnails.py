@@ -0,0 +1,136 @@
+"""
+Timeline thumbnails for the video editor.
+
+Instead of scrubbing the full-resolution <video>, the editor shows a strip of small
+thumbnails cut from one sprite sheet (a single cacheable JPEG) described by a JSON
+index. Thumbnails are evenly spaced but taken from the keyframe at or before each
+point: ffmpeg seeks there (-noaccurate_seek) and decodes that one frame only, and
+points that fall on the same keyframe share the decode.
+
+The index is written last, so once it exists the sprite sheet and poster do too.
+"""
+import bisect
+import json
+import os
+import subprocess
+
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from moviepy.config import FFMPEG_BINARY
+
+from .media_storage import get_media_storage
+from .probe import probe_video
+
+THUMBNAIL_WIDTH = 160
+MAX_THUMBNAILS = 60
+SPRITE_COLUMNS = 10
+POSTER_MAX_WIDTH = 1280
+JPEG_QUALITY = 70
+
+
+def thumbnail_paths(original_path):
+    """(sprite, poster, index) storage paths belonging to an upload's original file or blob."""
+    directory, filename = os.path.split(original_path)
+    session = os.path.splitext(filename)[0].replace('original_', '', 1)
+    return (
+        os.path.join(directory, f"thumbs_{session}.jpg"),
+        os.path.join(directory, f"poster_{session}.jpg"),
+        os.path.join(directory, f"thumbs_{session}.json"),
+    )
+
+
+def media_url(path):
+    return settings.MEDIA_URL + path.replace('\\', '/')
+
+
+def _scaled_size(width, height, target_width):
+    target_width = min(target_width, width)
+    target_height = max(2, int(round(target_width * height / width / 2)) * 2)
+    return target_width, target_height
+
+
+def grab_frame(full_path, t, size, accurate=False):
+    """Decodes the frame at t (or the keyframe before it) scaled to size=(w, h), as RGB."""
+    width, height = size
+    seek = ['-ss', f"{t:.3f}"] + ([] if accurate else ['-noaccurate_seek'])
+    output = subprocess.run(
+        [FFMPEG_BINARY, '-v', 'error'] + seek + ['-i', full_path,
+         '-map', '0:v:0', '-frames:v', '1', '-vf', f"scale={width}:{height}",
+         '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'],
+        capture_output=True, check=True,
+    ).stdout
+    if len(output) != width * height * 3:
+        return None
+    return np.frombuffer(output, dtype=np.uint8).reshape(height, width, 3)
+
+
+def _save_jpeg(image, path):
+    # Written to a temp file and published whole, so a reader never sees a half-written file
+    storage = get_media_storage()
+    temp_path = storage.temp_path(path)
+    image.save(temp_path, format='JPEG', quality=JPEG_QUALITY)
+    storage.save_from(temp_path, path)
+
+
+def build_thumbnails(video_path, sprite_path, poster_path, index_path):
+    """Renders the sprite sheet and poster frame and writes the JSON index. Returns the index."""
+    with get_media_storage().local_path(video_path) as video_full_path:
+        return _build_thumbnails(video_full_path, sprite_path, poster_path, index_path)
+
+
+def _build_thumbnails(video_full_path, sprite_path, poster_path, index_path):
+    info = probe_video(video_full_path, keyframes=True)
+    duration = info['duration']
+    if not duration or not info['width']:
+        raise ValueError(f"Cannot build thumbnails for {video_full_path}: no duration or size")
+
+    count = max(1, min(MAX_THUMBNAILS, int(duration)))
+    interval = duration / count
+    tile_w, tile_h = _scaled_size(info['width'], info['height'], THUMBNAIL_WIDTH)
+    columns = min(SPRITE_COLUMNS, count)
+    rows = -(-count // columns)
+    keyframes = info['keyframes'] or ()
+
+    sprite = Image.new('RGB', (columns * tile_w, rows * tile_h))
+    decoded = {}
+    thumbnails = []
+    for i in range(count):
+        t = (i + 0.5) * interval
+        # Seek target: the keyframe at or before t (t itself when no keyframe index is known)
+        k = bisect.bisect_right(keyframes, t) - 1
+        seek_t = keyframes[k] if k >= 0 else t
+        if seek_t not in decoded:
+            decoded[seek_t] = grab_frame(video_full_path, seek_t, (tile_w, tile_h))
+
+        x, y = (i % columns) * tile_w, (i // columns) * tile_h
+        if decoded[seek_t] is not None:
+            sprite.paste(Image.fromarray(decoded[seek_t]), (x, y))
+        # The time of the frame actually shown, so clicking a thumbnail lands on that picture
+        thumbnails.append({"time": round(seek_t, 3), "x": x, "y": y})
+
+    _save_jpeg(sprite, sprite_path)
+
+    poster_t = min(1.0, duration / 2)
+    poster = grab_frame(video_full_path, poster_t,
+                        _scaled_size(info['width'], info['height'], POSTER_MAX_WIDTH), accurate=True)
+    if poster is None:
+        poster = decoded[next(iter(decoded))]
+    if poster is not None:
+        _save_jpeg(Image.fromarray(poster), poster_path)
+
+    index = {
+        "sprite_url": media_url(sprite_path),
+        "poster_url": media_url(poster_path) if poster is not None else None,
+        "tile_width": tile_w,
+        "tile_height": tile_h,
+        "columns": columns,
+        "rows": rows,
+        "interval": round(interval, 3),
+        "duration": duration,
+        "thumbnails": thumbnails,
+    }
+    get_media_storage().save_bytes(json.dumps(index).encode('utf-8'), index_path)
+
+    print(f"[Thumbnails] 🖼️ {count} thumbnails ({len(decoded)} keyframe decodes) for {os.path.basename(video_full_path)}")
+    return index
@@ -0,0 +1,136 @@
+"""
+Resumable chunked video uploads.
+
+    POST   /api/video-upload/start/                 {filename, size}  -> upload_id
+    PUT    /api/video-upload/<upload_id>/           Content-Range: bytes <start>-<end>/<size>
+    GET    /api/video-upload/<upload_id>/           -> bytes received so far (where to resume)
+    POST   /api/video-upload/<upload_id>/finalize/  -> the usual session paths and metadata
+
+Chunks are written straight into the session's original file, so finalizing
+doesn't copy or reassemble anything: the file is renamed into the blob store. The file's size on disk is the source of
+truth for how much has arrived: a chunk cut off by a dropped connection keeps
+the bytes that did arrive, and the client resumes from the reported offset.
+
+The upload's metadata lives in Redis (next to the video job bookkeeping), so any
+web process or worker can take the next chunk. The content's SHA-256 is computed
+once on finalize (see blob_store.adopt_file), while the file is still in the page cache.
+"""
+import os
+import re
+import uuid
+
+from django.conf import settings
+
+from . import media_gc
+from .video_jobs import get_redis
+
+UPLOAD_PREFIX = 'video:upload:'
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """An upload request that can't be applied; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_content_range(header):
+    """Returns (start, end, total) from 'bytes start-end/total' (end inclusive)."""
+    match = _CONTENT_RANGE_RE.match((header or '').strip())
+    if not match:
+        raise UploadError("Missing or invalid Content-Range header (expected 'bytes start-end/total').")
+    start, end, total = (int(v) for v in match.groups())
+    if end < start or end >= total:
+        raise UploadError("Invalid Content-Range.")
+    return start, end, total
+
+
+def start_upload(original_path, full_path, size, ttl=None):
+    """Registers a new upload into full_path (created empty) and returns its id."""
+    if ttl is None:
+        ttl = settings.VIDEO_UPLOAD_TTL
+
+    upload_id = uuid.uuid4().hex
+    # Registered first: if Redis is down, no orphaned empty file is left behind
+    pipe = get_redis().pipeline()
+    pipe.hset(UPLOAD_PREFIX + upload_id, mapping={
+        'original_path': original_path,
+        'full_path': full_path,
+        'size': size,
+    })
+    pipe.expire(UPLOAD_PREFIX + upload_id, ttl)
+    pipe.execute()
+
+    try:
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        open(full_path, 'xb').close()
+    except OSError:
+        get_redis().delete(UPLOAD_PREFIX + upload_id)
+        raise
+    media_gc.touch(original_path)
+    return upload_id
+
+
+def get_upload(upload_id):
+    upload = get_redis().hgetall(UPLOAD_PREFIX + upload_id)
+    if not upload:
+        raise UploadError("Unknown or expired upload.", status=404)
+    upload['size'] = int(upload['size'])
+    return upload
+
+
+def received_bytes(upload):
+    try:
+        return os.path.getsize(upload['full_path'])
+    except FileNotFoundError:
+        raise UploadError("Upload file is gone.", status=410)
+
+
+def write_chunk(upload_id, stream, content_range):
+    """
+    Appends the request body at the Content-Range offset, which must be the number
+    of bytes received so far. Returns the new number of bytes received.
+    """
+    upload = get_upload(upload_id)
+    start, end, total = parse_content_range(content_range)
+    if total != upload['size']:
+        raise UploadError("Content-Range total doesn't match the upload size.")
+
+    received = received_bytes(upload)
+    if start != received:
+        raise UploadError(f"Expected a chunk at offset {received}.", status=409)
+
+    remaining = end - start + 1
+    with open(upload['full_path'], 'r+b') as f:
+        f.seek(start)
+        while remaining > 0:
+            try:
+                data = stream.read(min(WRITE_CHUNK_SIZE, remaining))
+            except OSError:
+                # The client went away mid-chunk (UnreadablePostError is an OSError): keep what arrived
+                data = b''
+            if not data:
+                break
+            f.write(data)
+            remaining -= len(data)
+        written = f.tell()
+
+    media_gc.touch(upload['original_path'])
+    if remaining > 0:
+        raise UploadError(f"Chunk ended early; resume at offset {written}.", status=400)
+    return written
+
+
+def finish_upload(upload_id):
+    """Checks that every byte arrived and forgets the upload. Returns its original_path."""
+    upload = get_upload(upload_id)
+    received = received_bytes(upload)
+    if received != upload['size']:
+        raise UploadError(f"Upload incomplete: {received} of {upload['size']} bytes received.", status=409)
+
+    get_redis().delete(UPLOAD_PREFIX + upload_id)
+    return upload['original_path']
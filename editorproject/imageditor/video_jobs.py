@@ -0,0 +1,216 @@
+"""
+Bookkeeping for in-flight video jobs, backed by the Redis instance Celery already uses.
+
+Each render request gets a fingerprint. While a job with that fingerprint is pending
+or running, a Redis lock (with a TTL, so a lost worker can't wedge it forever) maps
+the fingerprint to its task_id and repeated requests reuse that task.
+
+Task state changes are also published on a per-task Redis pub/sub channel so the
+status stream endpoint can push them to the browser instead of being polled.
+
+Renders are "latest job wins" per editing session: starting a new job for a session
+flags the previous one as cancelled, and the render loop aborts at the next frame.
+"""
+import json
+import hashlib
+import uuid
+
+import redis
+from celery.result import AsyncResult
+from django.conf import settings
+
+JOB_LOCK_PREFIX = 'video:job:'
+TASK_EVENTS_PREFIX = 'video:task-events:'
+CANCEL_PREFIX = 'video:cancel:'
+LATEST_JOB_PREFIX = 'video:latest:'
+TERMINAL_STATES = {'SUCCESS', 'FAILURE', 'REVOKED'}
+IN_FLIGHT_STATES = {'PENDING', 'RECEIVED', 'STARTED', 'RETRY', 'PROGRESS'}
+
+# Delete the lock only if it still points at our task (another job may have replaced it)
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Replace the lock only if it still points at the finished job we looked at (another
+# request may have taken over in between)
+_TAKEOVER_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return false
+"""
+
+# Rounds of lost takeover races before claim_job gives up deduplicating
+CLAIM_ATTEMPTS = 3
+
+_redis_client = None
+
+
+def get_redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return _redis_client
+
+
+def job_fingerprint(cache_key, preview_path):
+    """
+    Identifies a render job. The render cache key already covers input content,
+    tool, options and encoder settings; the preview path ties the job to its session.
+    """
+    return hashlib.sha256(f"{cache_key}|{preview_path}".encode('utf-8')).hexdigest()
+
+
+def claim_job(fingerprint, ttl=None):
+    """
+    Returns (task_id, is_new). When is_new is False an identical job is already
+    pending or running and task_id is that job's id; otherwise the caller owns the
+    lock and must dispatch the task under the returned task_id.
+    """
+    if ttl is None:
+        ttl = settings.VIDEO_JOB_LOCK_TTL
+
+    task_id = str(uuid.uuid4())
+    key = JOB_LOCK_PREFIX + fingerprint
+
+    try:
+        client = get_redis()
+        for _ in range(CLAIM_ATTEMPTS):
+            if client.set(key, task_id, nx=True, ex=ttl):
+                return task_id, True
+
+            existing_id = client.get(key)
+            if existing_id is None:
+                continue  # The lock expired in between
+            if AsyncResult(existing_id).state in IN_FLIGHT_STATES and not is_cancelled(existing_id):
+                return existing_id, False
+
+            # The previous job finished or was cancelled: take over, unless someone else just
+            # did (then the next round joins their job)
+            if client.eval(_TAKEOVER_SCRIPT, 1, key, existing_id, task_id, ttl):
+                return task_id, True
+
+        print(f"[Video Jobs] ⚠️ Lost the job lock race for {fingerprint}, skipping deduplication")
+        return task_id, True
+    except redis.RedisError as e:
+        print(f"[Video Jobs] ⚠️ Redis unavailable, skipping deduplication: {e}")
+        return task_id, True
+
+
+def release_job(fingerprint, task_id):
+    try:
+        get_redis().eval(_RELEASE_SCRIPT, 1, JOB_LOCK_PREFIX + fingerprint, task_id)
+    except redis.RedisError as e:
+        print(f"[Video Jobs] ⚠️ Could not release job lock {fingerprint}: {e}")
+
+
+def request_cancel(task_id, ttl=None):
+    """
+    Cancels a video task: queued tasks are revoked before they start and running
+    renders see the cancellation flag between frames.
+    """
+    if ttl is None:
+        ttl = settings.VIDEO_JOB_LOCK_TTL
+
+    AsyncResult(task_id).revoke()
+    try:
+        get_redis().set(CANCEL_PREFIX + task_id, 1, ex=ttl)
+    except redis.RedisError as e:
+        print(f"[Video Jobs] ⚠️ Could not flag task {task_id} as cancelled: {e}")
+    publish_task_event(task_id, 'REVOKED')
+
+
+def is_cancelled(task_id):
+    try:
+        return bool(get_redis().exists(CANCEL_PREFIX + task_id))
+    except redis.RedisError:
+        return False
+
+
+def supersede_session_job(session_key, task_id, ttl=None):
+    """
+    Records task_id as the latest job of an editing session and cancels the job it
+    replaces, if any. Returns the superseded task_id (or None).
+    """
+    if ttl is None:
+        ttl = settings.VIDEO_JOB_LOCK_TTL
+
+    try:
+        previous_id = get_redis().set(LATEST_JOB_PREFIX + session_key, task_id, ex=ttl, get=True)
+    except redis.RedisError as e:
+        print(f"[Video Jobs] ⚠️ Could not record latest job for {session_key}: {e}")
+        return None
+
+    if previous_id and previous_id != task_id:
+        request_cancel(previous_id)
+        return previous_id
+    return None
+
+
+def cancel_session_job(session_key):
+    """
+    Cancels the session's in-flight job without starting a new one (e.g. the preview was
+    served from the render cache). Returns the cancelled task_id (or None).
+    """
+    try:
+        previous_id = get_redis().getdel(LATEST_JOB_PREFIX + session_key)
+        in_flight = bool(previous_id) and AsyncResult(previous_id).state in IN_FLIGHT_STATES
+    except redis.RedisError as e:
+        print(f"[Video Jobs] ⚠️ Could not look up the latest job for {session_key}: {e}")
+        return None
+
+    if in_flight:
+        request_cancel(previous_id)
+        return previous_id
+    return None
+
+
+def task_events_channel(task_id):
+    return TASK_EVENTS_PREFIX + task_id
+
+
+def task_status_payload(task_id, status, result=None):
+    """
+    Builds the status dict shared by the polling endpoint and the event stream.
+    `result` is the task's return value on SUCCESS, its progress meta on PROGRESS
+    and the exception on FAILURE.
+    """
+    payload = {
+        "task_id": task_id,
+        "status": status,
+    }
+
+    if status == 'SUCCESS' and isinstance(result, dict):
+        file_path = result.get("preview_path")
+        if file_path:
+            url_path = file_path.replace('\\', '/')
+            payload["preview_url"] = settings.MEDIA_URL + url_path
+            payload["preview_file_path"] = file_path
+        if result.get("url"):
+            # Finished profile upload (upload_to_profile_task)
+            payload["url"] = result["url"]
+
+    elif status == 'PROGRESS':
+        # Frame-accurate progress published by process_video_task
+        payload["progress"] = result
+
+    elif status == 'FAILURE':
+        payload["error"] = str(result)
+
+    elif status == 'REVOKED':
+        payload["cancelled"] = True
+
+    return payload
+
+
+def publish_task_event(task_id, status, result=None):
+    try:
+        get_redis().publish(
+            task_events_channel(task_id),
+            json.dumps(task_status_payload(task_id, status, result), default=str),
+        )
+    except redis.RedisError as e:
+        print(f"[Video Jobs] ⚠️ Could not publish event for task {task_id}: {e}")
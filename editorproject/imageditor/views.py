@@ -2,20 +2,32 @@ import io
 import os
 import json
 import uuid
-import shutil
-import atexit
 from django.conf import settings
 from django.contrib.auth.forms import AuthenticationForm
-from django.http import JsonResponse, FileResponse, Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
 from PIL import Image
 from copy import deepcopy
 from celery.result import AsyncResult
-from .tasks import process_video_task
+from asgiref.sync import sync_to_async
+import redis
+import redis.asyncio as aioredis
+from .tasks import process_video_task, generate_video_thumbnails, upload_to_profile_task
+from . import (blob_store, encoding, media_gc, media_sessions, media_versions, profile_uploads, render_cache,
+               uploads, video_jobs)
+from .probe import probe_video
+from .thumbnails import thumbnail_paths, media_url
+from .file_responses import offloaded_file_response, ranged_file_response
+from urllib.parse import quote
+from .streaming import ensure_faststart
+from .media_storage import get_media_storage
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout, update_session_auth_hash
 from django.contrib import messages
@@ -23,7 +35,6 @@ from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm
 from .forms import UserRegisterForm, UserUpdateForm
 from django.core.files.base import ContentFile
 from .models import UserEdit
-import cloudinary.uploader
 from django.shortcuts import get_object_or_404
 
 # Google Gemini imports for AI image generation
@@ -50,51 +61,15 @@ EDITOR_TOOLS = deepcopy(BASE_EDITOR_TOOLS)
 TEMP_IMAGE_DIR = 'temp_edited_images'
 TEMP_OVERLAY_DIR = 'temp_overlays'
 AI_EDITED_IMAGE_DIR = 'temp_edited_images'  # Store AI-generated images in temp directory for session cleanup
+SSE_KEEPALIVE_SECONDS = 15  # Comment line sent on idle task event streams so proxies keep them open
 
 
-# ... (Cleanup Logic, atexit.register, setup_temp_dir, generate_temp_file_path, parse_options remain unchanged)
+# ... (Cleanup Logic, setup_temp_dir, generate_temp_file_path, parse_options remain unchanged)
 # ... (All utility functions remain the same as the previous response)
 
 def home(request):
     return render(request, 'imageditor/homepage.html')
 
-def cleanup_temp_images():
-    # ... (unchanged)
-    if hasattr(settings, 'MEDIA_ROOT') and settings.MEDIA_ROOT:
-        temp_path = os.path.join(settings.MEDIA_ROOT, TEMP_IMAGE_DIR)
-        overlay_path = os.path.join(settings.MEDIA_ROOT, TEMP_OVERLAY_DIR)
-
-        # 1. DELETE: Delete the entire directory if it exists
-        if os.path.exists(temp_path):
-            try:
-                print(f"\n[Cleanup] 🗑️ Deleting temporary images directory: {temp_path}")
-                shutil.rmtree(temp_path)
-                print("[Cleanup] ✅ Temporary images deleted.")
-            except Exception as e:
-                print(f"[Cleanup] ❌ Error during deletion: {e}")
-
-        # Delete overlay directory
-        if os.path.exists(overlay_path):
-            try:
-                print(f"[Cleanup] 🗑️ Deleting temporary overlays directory: {overlay_path}")
-                shutil.rmtree(overlay_path)
-                print("[Cleanup] ✅ Temporary overlays deleted.")
-            except Exception as e:
-                print(f"[Cleanup] ❌ Error during overlay deletion: {e}")
-
-        # 2. RECREATE: Ensure the directory exists after cleanup (critical for reloads)
-        try:
-            os.makedirs(temp_path, exist_ok=True)
-            os.makedirs(overlay_path, exist_ok=True)
-            print("[Cleanup] 📁 Recreated temporary directories for future use.")
-        except Exception as e:
-            print(f"[Cleanup] ❌ Error recreating directory: {e}")
-
-
-# Register the cleanup function to run when the Python interpreter exits
-atexit.register(cleanup_temp_images)
-
-
 def setup_temp_dir():
     # ... (unchanged)
     if not hasattr(settings, 'MEDIA_ROOT') or not settings.MEDIA_ROOT:
@@ -133,19 +108,36 @@ def generate_stable_file_paths(extension='png'):
     return original_path, working_path, preview_path
 
 
+def session_paths_for(original_path):
+    """The (original, working, preview) paths of the session an original file belongs to."""
+    directory, filename = os.path.split(original_path)
+    suffix = filename.split('original_', 1)[-1]
+    return (
+        original_path,
+        os.path.join(directory, f"working_{suffix}"),
+        os.path.join(directory, f"preview_{suffix}"),
+    )
+
+
 def cleanup_session_files(original_path, working_path, preview_path):
     """
     Clean up all three files from a previous session when uploading a new image.
     This ensures we don't accumulate files from multiple uploads.
     """
+    storage = get_media_storage()
     for file_path in [original_path, working_path, preview_path]:
         try:
-            if file_path and default_storage.exists(file_path):
-                default_storage.delete(file_path)
+            if file_path and storage.exists(file_path):
+                storage.delete(file_path)
                 print(f"[Session Cleanup] Deleted old file: {file_path}")
         except Exception as e:
             print(f"[Session Cleanup] Error deleting {file_path}: {e}")
 
+    # The session no longer counts against its owner's quota or needs collecting
+    paths = [path for path in (original_path, working_path, preview_path) if path]
+    media_sessions.forget({media_sessions.session_id_for(path) for path in paths})
+    media_gc.forget(*paths)
+
 
 def parse_options(options_json):
     """Parse and convert options from JSON string, handling type conversions."""
@@ -208,8 +200,7 @@ def parse_options(options_json):
 def get_image_dimensions(file_path):
     """Utility to get width and height from a stored image file."""
     try:
-        full_path = default_storage.path(file_path)
-        with Image.open(full_path) as img:
+        with get_media_storage().open(file_path) as f, Image.open(f) as img:
             return img.size
     except Exception:
         return 0, 0
@@ -272,14 +263,24 @@ def initial_upload(request):
     # OPTIMIZATION: Generate stable file paths using descriptive names and single session UUID
     original_file_path, working_file_path, preview_file_path = generate_stable_file_paths(file_ext)
 
-    # 1. Save the ORIGINAL file (immutable state)
-    default_storage.save(original_file_path, uploaded_file)
-
-    # 2. Create the WORKING COPY from the original file (Committed State)
-    default_storage.save(working_file_path, default_storage.open(original_file_path))
-
-    # 3. Create an initial PREVIEW file (Transient State)
-    default_storage.save(preview_file_path, default_storage.open(working_file_path))
+    # Per-user quota: the user's least recently used sessions make room for this one
+    try:
+        media_sessions.make_room(request, uploaded_file.size)
+    except media_sessions.QuotaExceeded as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=413)
+
+    # 1. Store the upload by content hash (a repeat upload of the same image is only hashed)
+    blob_path, content_digest = blob_store.store_upload(uploaded_file, file_ext)
+
+    # OPTIMIZATION: ORIGINAL (immutable), WORKING (committed) and PREVIEW (transient) start as
+    # reflinks/hardlinks of the blob; they only get their own bytes once an edit replaces them
+    storage = get_media_storage()
+    blob_full_path = default_storage.path(blob_path)
+    original_file_path = storage.copy_in(blob_full_path, original_file_path, new=True)
+    working_file_path = storage.copy_in(blob_full_path, working_file_path, new=True)
+    preview_file_path = storage.copy_in(blob_full_path, preview_file_path, new=True)
+    media_sessions.register(request, 'image', [original_file_path, working_file_path, preview_file_path])
+    media_gc.touch(blob_path, original_file_path, working_file_path, preview_file_path)
 
     # Get dimensions of the uploaded image
     width, height = get_image_dimensions(working_file_path)
@@ -293,7 +294,8 @@ def initial_upload(request):
         "preview_file_path": preview_file_path,
         "image_width": width,
         "image_height": height,
-        "temp_image_url": temp_image_url
+        "temp_image_url": temp_image_url,
+        "version_url": publish_version(working_file_path, content_digest),
     })
 
 
@@ -314,22 +316,17 @@ def reset_image_state(request):
         return JsonResponse({'error': 'Original file path missing.'}, status=400)
 
     try:
-        # OPTIMIZATION: Delete existing files to prepare for overwrite
-        if working_file_path and default_storage.exists(working_file_path):
-            default_storage.delete(working_file_path)
-        if preview_file_path and default_storage.exists(preview_file_path):
-            default_storage.delete(preview_file_path)
-
         # OPTIMIZATION: REUSE existing paths instead of calling generate_temp_file_path()
         # This prevents creating new files with different UUIDs
+        # OPTIMIZATION: Atomic clone/stream replacement, nothing is read into memory
 
         # 1. Overwrite the WORKING file with content from ORIGINAL (Resets committed state)
-        with default_storage.open(original_file_path, 'rb') as original_file:
-            default_storage.save(working_file_path, ContentFile(original_file.read()))
+        storage = get_media_storage()
+        storage.copy(original_file_path, working_file_path)
 
-        # 2. Overwrite the PREVIEW file with content from WORKING (Resets transient state)
-        with default_storage.open(working_file_path, 'rb') as working_file:
-            default_storage.save(preview_file_path, ContentFile(working_file.read()))
+        # 2. Overwrite the PREVIEW file with content from ORIGINAL (Resets transient state)
+        storage.copy(original_file_path, preview_file_path)
+        media_gc.touch(original_file_path, working_file_path, preview_file_path)
 
         # Get dimensions of the reset image
         width, height = get_image_dimensions(working_file_path)
@@ -342,7 +339,8 @@ def reset_image_state(request):
             "preview_file_path": preview_file_path,  # Same path, not new_preview_file_path
             "image_width": width,
             "image_height": height,
-            "temp_image_url": temp_image_url
+            "temp_image_url": temp_image_url,
+            "version_url": publish_version(working_file_path),
         })
 
     except FileNotFoundError:
@@ -375,22 +373,15 @@ def reset_preview_to_working(request):
         return JsonResponse({'success': False, 'error': 'Missing current_preview_path.'}, status=400)
 
     try:
-        if not default_storage.exists(working_file_path):
+        storage = get_media_storage()
+        if not storage.exists(working_file_path):
             return JsonResponse({'success': False, 'error': 'Working file not found.'}, status=404)
 
-        # Delete the current preview file to prepare for overwrite
-        try:
-            if default_storage.exists(current_preview_path):
-                default_storage.delete(current_preview_path)
-        except Exception:
-            # Non-fatal: ignore deletion errors
-            pass
-
         # OPTIMIZATION: REUSE the existing current_preview_path instead of calling generate_temp_file_path()
         # This prevents creating a new file with a different UUID
-        with default_storage.open(working_file_path, 'rb') as wf:
-            content = ContentFile(wf.read())
-            saved_path = default_storage.save(current_preview_path, content)
+        # OPTIMIZATION: Atomic clone/stream replacement, nothing is read into memory
+        saved_path = storage.copy(working_file_path, current_preview_path)
+        media_gc.touch(working_file_path, saved_path)
 
         temp_image_url = settings.MEDIA_URL + saved_path
 
@@ -420,8 +411,10 @@ def preview_image(request):
             return JsonResponse({'error': 'Missing state path, tool key, or options.'}, status=400)
 
         # 1. Load the committed working copy
-        full_path_source = default_storage.path(working_file_path)
-        image = Image.open(full_path_source)
+        storage = get_media_storage()
+        with storage.open(working_file_path) as f:
+            image = Image.open(f)
+            image.load()
 
         options = parse_options(options_json)
         tool_config = EDITOR_TOOLS.get(tool_key)
@@ -458,8 +451,9 @@ def preview_image(request):
         output.seek(0)
 
         # 2. Overwrite the PREVIEW file
-        default_storage.delete(current_preview_path)
-        saved_path = default_storage.save(current_preview_path, ContentFile(output.read()))
+        # OPTIMIZATION: Written next to the preview and renamed over it (or uploaded), no delete + save window
+        saved_path = storage.save_bytes(output.getvalue(), current_preview_path)
+        media_gc.touch(working_file_path, saved_path)
 
         temp_image_url = settings.MEDIA_URL + saved_path
 
@@ -498,16 +492,10 @@ def process_image(request):
         if not working_file_path or not preview_file_path:
             return JsonResponse({'error': 'Missing working or preview path.'}, status=400)
 
-        # 1. Read the image data from the current PREVIEW file
-        full_path_source = default_storage.path(preview_file_path)
-
-        # 2. Copy the content of the PREVIEW file into the WORKING COPY file
-        with default_storage.open(full_path_source, 'rb') as source_file:
-            content = ContentFile(source_file.read())
-
-        # 3. Overwrite the WORKING COPY (Commit the change)
-        default_storage.delete(working_file_path)
-        saved_path = default_storage.save(working_file_path, content)
+        # Overwrite the WORKING COPY with the PREVIEW file (Commit the change)
+        # OPTIMIZATION: Atomic clone/stream replacement, nothing is read into memory
+        saved_path = get_media_storage().copy(preview_file_path, working_file_path)
+        media_gc.touch(saved_path, preview_file_path)
 
         temp_image_url = settings.MEDIA_URL + saved_path
 
@@ -519,7 +507,8 @@ def process_image(request):
             "temp_image_url": temp_image_url,
             "working_file_path": saved_path,
             "new_width": new_width,
-            "new_height": new_height
+            "new_height": new_height,
+            "version_url": publish_version(saved_path),
         })
 
     except FileNotFoundError:
@@ -553,18 +542,20 @@ def upload_overlay_image(request):
         overlay_path = os.path.join(TEMP_OVERLAY_DIR, filename)
 
         # Save the file
-        saved_path = default_storage.save(overlay_path, uploaded_file)
-
-        # Get dimensions
-        full_path = default_storage.path(saved_path)
-        with Image.open(full_path) as img:
+        storage = get_media_storage()
+        with Image.open(uploaded_file) as img:
             width, height = img.size
 
             # Verify it's actually a valid PNG with alpha channel
             if img.mode not in ('RGBA', 'LA', 'P'):
                 # Convert to RGBA if needed
-                img = img.convert('RGBA')
-                img.save(full_path, 'PNG')
+                output = io.BytesIO()
+                img.convert('RGBA').save(output, 'PNG')
+                saved_path = storage.save_bytes(output.getvalue(), overlay_path)
+            else:
+                uploaded_file.seek(0)
+                saved_path = storage.save_bytes(uploaded_file.read(), overlay_path)
+        media_gc.touch(saved_path)
 
         overlay_url = settings.MEDIA_URL + saved_path
 
@@ -589,10 +580,11 @@ def download_image(request):
         return JsonResponse({"success": False, "error": "Missing file path."}, status=400)
 
     try:
-        if not default_storage.exists(file_path):
+        storage = get_media_storage()
+        if not storage.exists(file_path):
             raise Http404("File not found.")
 
-        full_path = default_storage.path(file_path)
+        media_gc.touch(file_path)
 
         file_name = os.path.basename(file_path)
         download_name = f"edited_{uuid.uuid4().hex[:8]}_{file_name}"
@@ -603,9 +595,7 @@ def download_image(request):
         elif file_name.lower().endswith(('.jpg', '.jpeg')):
             content_type = 'image/jpeg'
 
-        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="{download_name}"'
-        return response
+        return download_response(request, storage, file_path, content_type, download_name)
 
     except FileNotFoundError:
         raise Http404("File not found.")
@@ -614,43 +604,95 @@ def download_image(request):
 
 
 
+def download_response(request, storage, file_path, content_type=None, download_name=None,
+                      cache_control='private, no-cache'):
+    """
+    Sends a session file (as an attachment when download_name is given) once the view has
+    checked the request may have it.
+    OPTIMIZATION: With MEDIA_DOWNLOAD_OFFLOAD set, nginx (X-Accel-Redirect) or Apache/lighttpd
+    (X-Sendfile) sends the bytes and Range requests, so a large video download doesn't hold a
+    Django worker; otherwise the file is streamed here with Range support.
+    """
+    if settings.MEDIA_DOWNLOAD_OFFLOAD == 'x-accel-redirect':
+        # The prefix is an `internal` nginx location over MEDIA_ROOT (or the media store)
+        location = settings.MEDIA_DOWNLOAD_ACCEL_PREFIX + quote(file_path.replace('\\', '/'))
+        return offloaded_file_response('X-Accel-Redirect', location, content_type, download_name, cache_control)
+
+    if settings.MEDIA_DOWNLOAD_OFFLOAD == 'x-sendfile' and storage.is_local:
+        # Only for MEDIA_ROOT: a download cached from an HTTP storage can be deleted or evicted
+        # before the front-end server opens it, so those are streamed below
+        return offloaded_file_response('X-Sendfile', default_storage.path(file_path), content_type,
+                                       download_name, cache_control)
+
+    with storage.local_path(file_path) as full_path:
+        # The response holds the file open, so it is still readable after local_path cleans up
+        return ranged_file_response(request, full_path, content_type=content_type, download_name=download_name,
+                                    cache_control=cache_control)
+
+
+def publish_version(path, digest=None):
+    """Signed, immutable URL of a committed file (see media_versions), or None if it couldn't be published."""
+    try:
+        version_path, url = media_versions.publish(path, digest)
+    except Exception as e:
+        print(f"[Media Versions] ⚠️ Could not publish {path}: {e}")
+        return None
+    media_gc.touch(version_path)
+    return url
+
+
+@require_http_methods(["GET", "HEAD"])
+def media_version(request, signature, name):
+    """
+    Serves a committed version by its signed URL. The content behind a version URL never
+    changes, so browsers and CDNs may keep it without revalidating for as long as the
+    version is guaranteed to exist (see media_versions.max_age).
+    """
+    if not media_versions.valid_signature(name, signature):
+        raise Http404("File not found.")
+
+    storage = get_media_storage()
+    path = media_versions.version_path(name)
+    if not storage.exists(path):
+        raise Http404("File not found.")
+    media_gc.touch(path)
+
+    # OPTIMIZATION: Long-lived immutable caching instead of no-cache + revalidation on every view
+    return download_response(request, storage, path,
+                             cache_control=f"public, max-age={media_versions.max_age()}, immutable")
+
+
 @login_required
 def save_to_profile(request):
+    """
+    Queues the upload of the current working file to Cloudinary and returns its job id
+    right away; the browser polls /api/task-status/<job_id>/ until it is saved.
+    """
     if request.method == "POST":
         working_file_path = request.POST.get('working_file_path')
         media_type = request.POST.get('media_type')
 
-        if not working_file_path:
+        if not working_file_path or not get_media_storage().exists(working_file_path):
             return JsonResponse({'success': False, 'error': 'No file found to save.'})
 
         try:
-
-            with default_storage.open(working_file_path, 'rb') as f:
-                file_content = f.read()
-
-
-            upload_result = cloudinary.uploader.upload(
-                ContentFile(file_content),
-                folder="edits/",
-                resource_type="auto",
-                public_id=f"edit_{uuid.uuid4().hex[:8]}"
-            )
-
-
-            new_edit = UserEdit.objects.create(
-                user=request.user,
-                media_type=media_type,
-                edited_file=upload_result.get('secure_url')
+            # OPTIMIZATION: The upload streams from disk in a Celery task (chunked, retried with
+            # backoff) instead of reading the whole file into memory inside the request
+            job_id = str(uuid.uuid4())
+            snapshot_path = profile_uploads.snapshot(working_file_path, job_id)
+            upload_to_profile_task.apply_async(
+                args=[request.user.pk, snapshot_path, media_type, f"edit_{uuid.uuid4().hex[:8]}"],
+                task_id=job_id,
             )
 
             return JsonResponse({
                 'success': True,
-                'message': 'Saved to profile!',
-                'url': new_edit.edited_file
-            })
+                'job_id': job_id,
+                'message': 'Saving to profile...',
+            }, status=202)
 
         except Exception as e:
-            return JsonResponse({'success': False, 'error': f"Cloudinary error: {str(e)}"})
+            return JsonResponse({'success': False, 'error': f"Could not start upload: {str(e)}"})
 
 
 # ==========================================================================================
@@ -687,29 +729,74 @@ def video_editor_page(request):
 def preview_video(request):
     """
     Triggers the background Celery task for video editing.
-    Returns a task_id so the frontend can poll for status.
+    Returns a task_id so the frontend can poll for status, or the finished
+    preview right away when the same render is already in the render cache.
     """
     try:
         working_file_path = request.POST.get('working_file_path')
         current_preview_path = request.POST.get('current_preview_path')
         tool_key = request.POST.get('tool_key')
         options_json = request.POST.get('options')
+        profile = request.POST.get('profile', encoding.DEFAULT_PROFILE)
 
         if not all([working_file_path, current_preview_path, tool_key, options_json]):
             return JsonResponse({'error': 'Missing required parameters.'}, status=400)
+        if profile not in encoding.ENCODING_PROFILES:
+            return JsonResponse({'error': f"Unknown encoding profile '{profile}'."}, status=400)
 
         options = parse_options(options_json)
-
-        task = process_video_task.delay(
+        media_gc.touch(working_file_path, current_preview_path)
+
+        # OPTIMIZATION: Identical (input, tool, options, encoder) renders are served from the cache
+        storage = get_media_storage()
+        with storage.local_path(working_file_path) as working_full_path:
+            input_hash = render_cache.content_hash(working_full_path)
+        cache_key = render_cache.render_cache_key(
+            input_hash,
             tool_key,
             options,
-            working_file_path,
-            current_preview_path
+            encoding.cache_settings(profile),
         )
+        cached_path = render_cache.lookup(cache_key)
+        if cached_path:
+            # Latest job wins here too: a render still running for this session must not
+            # overwrite the preview served from the cache when it finishes
+            video_jobs.cancel_session_job(current_preview_path)
+            storage.copy_in(cached_path, current_preview_path)
+            if storage.is_local:
+                render_cache.copy_known_hash(cached_path, default_storage.path(current_preview_path))
+            url_path = current_preview_path.replace('\\', '/')
+            return JsonResponse({
+                "success": True,
+                "cached": True,
+                "status": "SUCCESS",
+                "preview_url": settings.MEDIA_URL + url_path,
+                "preview_file_path": current_preview_path,
+            })
+
+        # OPTIMIZATION: Double-clicks and re-sent previews reuse the identical in-flight task
+        fingerprint = video_jobs.job_fingerprint(cache_key, current_preview_path)
+        task_id, is_new = video_jobs.claim_job(fingerprint)
+
+        if is_new:
+            # Latest job wins: a new preview for this session cancels the render it replaces
+            video_jobs.supersede_session_job(current_preview_path, task_id)
+            try:
+                process_video_task.apply_async(
+                    args=[tool_key, options, working_file_path, current_preview_path],
+                    kwargs={"cache_key": cache_key, "fingerprint": fingerprint, "profile": profile},
+                    task_id=task_id,
+                    # OPTIMIZATION: Previews jump ahead of commit/export renders (separate queues + priority)
+                    **settings.VIDEO_PROFILE_ROUTES[profile],
+                )
+            except Exception:
+                video_jobs.release_job(fingerprint, task_id)
+                raise
 
         return JsonResponse({
             "success": True,
-            "task_id": task.id
+            "task_id": task_id,
+            "deduplicated": not is_new
         })
 
     except Exception as e:
@@ -722,23 +809,88 @@ def check_task_status(request, task_id):
     Endpoint for the frontend to check if the video is finished.
     """
     result = AsyncResult(task_id)
+    return JsonResponse(video_jobs.task_status_payload(task_id, result.status, result.result))
 
-    response_data = {
-        "task_id": task_id,
-        "status": result.status,
-    }
 
-    if result.status == 'SUCCESS':
-        file_path = result.result.get("preview_path")
-        if file_path:
-            url_path = file_path.replace('\\', '/')
-            response_data["preview_url"] = settings.MEDIA_URL + url_path
-            response_data["preview_file_path"] = file_path
+@csrf_exempt
+@require_http_methods(["POST"])
+def cancel_task(request, task_id):
+    """
+    Cancels a queued or running video task. A running render stops at the next
+    frame and discards its partial output.
+    """
+    try:
+        video_jobs.request_cancel(task_id)
+        return JsonResponse({"success": True, "task_id": task_id})
+    except Exception as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
 
-    elif result.status == 'FAILURE':
-        response_data["error"] = str(result.result)
 
-    return JsonResponse(response_data)
+@require_http_methods(["GET"])
+async def task_events(request, task_id):
+    """
+    Server-sent event stream of a video task's progress and completion.
+    One long-lived connection per job replaces interval polling of check_task_status;
+    needs an ASGI server (e.g. uvicorn) so the stream isn't buffered.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the whole stream would be collected before the first byte is sent.
+        # 204 makes EventSource give up for good, and the page polls check_task_status instead
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(_task_event_stream(task_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+
+def _sse_message(payload):
+    return f"data: {json.dumps(payload, default=str)}\n\n"
+
+
+async def _task_event_stream(task_id):
+    client = aioredis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    pubsub = client.pubsub()
+    try:
+        # Subscribe before reading the current state so no transition is missed in between
+        await pubsub.subscribe(video_jobs.task_events_channel(task_id))
+
+        result = AsyncResult(task_id)
+        status, value = await sync_to_async(lambda: (result.status, result.result))()
+        yield _sse_message(video_jobs.task_status_payload(task_id, status, value))
+        if status in video_jobs.TERMINAL_STATES:
+            return
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_KEEPALIVE_SECONDS)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+
+            payload = json.loads(message['data'])
+            yield _sse_message(payload)
+            if payload.get('status') in video_jobs.TERMINAL_STATES:
+                return
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_media(request, path):
+    """
+    Serves MEDIA_ROOT during development with byte-range support, so the editor's
+    <video> player can seek without downloading the whole file.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found.")
+    if os.path.relpath(full_path, settings.MEDIA_ROOT).split(os.sep, 1)[0] == media_versions.VERSION_DIR:
+        raise Http404("File not found.")  # Only through their signed URLs (media_version)
+    if not os.path.isfile(full_path):
+        raise Http404("File not found.")
+    return ranged_file_response(request, full_path)
 
 
 @require_http_methods(["GET"])
@@ -752,23 +904,20 @@ def download_video(request):
         return JsonResponse({"success": False, "error": "Missing file path."}, status=400)
 
     try:
-        if not default_storage.exists(file_path):
+        storage = get_media_storage()
+        if not storage.exists(file_path):
             raise Http404("Video file not found.")
 
-        full_path = default_storage.path(file_path)
-        file_name = os.path.basename(file_path)
+        media_gc.touch(file_path)
 
         download_name = f"edited_video_{uuid.uuid4().hex[:8]}.mp4"
 
-        response = FileResponse(open(full_path, 'rb'), content_type='video/mp4')
-        response['Content-Disposition'] = f'attachment; filename="{download_name}"'
-        return response
+        # OPTIMIZATION: Range/If-Range support so interrupted downloads resume instead of restarting
+        return download_response(request, storage, file_path, 'video/mp4', download_name)
 
     except Exception as e:
         return JsonResponse({"success": False, "error": f"Download error: {str(e)}"}, status=500)
 
-from moviepy import VideoFileClip
-
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -784,15 +933,13 @@ def process_video(request):
         if not working_file_path or not preview_file_path:
             return JsonResponse({'error': 'Missing working or preview path.'}, status=400)
 
-        full_path_source = default_storage.path(preview_file_path)
-
-        with default_storage.open(full_path_source, 'rb') as source_file:
-            content = ContentFile(source_file.read())
-
-        if default_storage.exists(working_file_path):
-            default_storage.delete(working_file_path)
-
-        saved_path = default_storage.save(working_file_path, content)
+        # OPTIMIZATION: Atomic clone/stream replacement; a large video is never read into memory
+        storage = get_media_storage()
+        saved_path = storage.copy(preview_file_path, working_file_path)
+        media_gc.touch(saved_path, preview_file_path)
+        if storage.is_local:
+            # The next preview's render cache key needs the new working file's hash
+            render_cache.copy_known_hash(default_storage.path(preview_file_path), default_storage.path(saved_path))
 
         return JsonResponse({
             "success": True,
@@ -816,12 +963,11 @@ def reset_video_state(request):
     preview_path = request.POST.get('preview_file_path')
 
     try:
-        with default_storage.open(original_path, 'rb') as f:
-            content = f.read()
-            if default_storage.exists(working_path): default_storage.delete(working_path)
-            default_storage.save(working_path, ContentFile(content))
-            if default_storage.exists(preview_path): default_storage.delete(preview_path)
-            default_storage.save(preview_path, ContentFile(content))
+        # OPTIMIZATION: Atomic clone/stream replacement; a large video is never read into memory
+        storage = get_media_storage()
+        storage.copy(original_path, working_path)
+        storage.copy(original_path, preview_path)
+        media_gc.touch(original_path, working_path, preview_path)
 
         return JsonResponse({"success": True, "temp_video_url": settings.MEDIA_URL + original_path})
     except Exception as e:
@@ -840,30 +986,165 @@ def initial_video_upload(request):
 
     orig_name, work_name, prev_name = generate_stable_file_paths(file_ext)
 
-    actual_original_path = default_storage.save(orig_name, uploaded_file)
+    # Per-user quota: the user's least recently used sessions make room for this one
+    try:
+        media_sessions.make_room(request, uploaded_file.size)
+    except media_sessions.QuotaExceeded as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=413)
+
+    # OPTIMIZATION: Hashed while it is written; a video that was uploaded before is not stored again
+    blob_path, content_digest = blob_store.store_upload(uploaded_file, file_ext, prepare=_faststart_upload)
 
-    with default_storage.open(actual_original_path) as f:
-        content = f.read()
-        actual_working_path = default_storage.save(work_name, ContentFile(content))
-        actual_preview_path = default_storage.save(prev_name, ContentFile(content))
+    return JsonResponse(start_video_session(request, blob_path, orig_name, work_name, prev_name, content_digest))
 
+
+def _faststart_upload(full_path):
+    """blob_store prepare step: moov atom first, so the player can start and seek before the full download."""
     try:
-        full_path = default_storage.path(actual_working_path)
-        with VideoFileClip(full_path) as clip:
-            width, height = clip.w, clip.h
+        return ensure_faststart(full_path)
+    except Exception as e:
+        print(f"[Upload] ⚠️ Could not faststart-remux {os.path.basename(full_path)}: {e}")
+        return False
+
+
+def start_video_session(request, blob_path, orig_name, work_name, prev_name, content_digest=None):
+    """
+    Turns a stored upload (see blob_store) into an editing session: original/working/preview
+    clones, metadata probe and background thumbnails. Returns the upload response dict.
+    `content_digest` is the SHA-256 of the blob's content (see blob_store.adopt_file).
+    """
+    # OPTIMIZATION: Original/working/preview are reflinks/hardlinks of the blob instead of
+    # full copies read through memory; renders replace them rather than write in place
+    storage = get_media_storage()
+    blob_full_path = default_storage.path(blob_path)
+    actual_original_path = storage.copy_in(blob_full_path, orig_name, new=True)
+    actual_working_path = storage.copy_in(blob_full_path, work_name, new=True)
+    actual_preview_path = storage.copy_in(blob_full_path, prev_name, new=True)
+
+    media_sessions.register(request, 'video', [actual_original_path, actual_working_path, actual_preview_path])
+    media_gc.touch(actual_original_path, actual_working_path, actual_preview_path)
+
+    try:
+        with storage.local_path(actual_working_path) as working_full_path:
+            if content_digest:
+                # Lets the render cache key the first preview without hashing the video again
+                render_cache.remember_hash(working_full_path, content_digest)
+
+            # OPTIMIZATION: One header probe instead of opening a full VideoFileClip in the web process
+            info = probe_video(working_full_path)
+        width, height, duration = info['width'], info['height'], info['duration']
     except Exception as e:
         print(f"Error getting video dimensions: {e}")
-        width, height = 0, 0
+        width, height, duration = 0, 0, 0
 
-    return JsonResponse({
+    # Timeline sprite sheet + poster are built in the background; the editor polls for the index.
+    # They belong to the blob, so a repeat upload of the same video gets them immediately.
+    sprite_path, poster_path, index_path = thumbnail_paths(blob_path)
+    media_gc.touch(blob_path, blob_store.digest_path(blob_path), sprite_path, poster_path, index_path)
+    try:
+        if not storage.exists(index_path):
+            # Built from the (immutable) original, which every worker can read through the storage
+            generate_video_thumbnails.apply_async(
+                args=[actual_original_path, sprite_path, poster_path, index_path],
+                queue='video_preview',
+                priority=5,  # Behind interactive preview renders
+            )
+        thumbnails_index_url = media_url(index_path)
+    except Exception as e:
+        print(f"[Thumbnails] ⚠️ Could not queue thumbnail generation: {e}")
+        thumbnails_index_url = None
+
+    return {
         "success": True,
         "original_file_path": actual_original_path,  # Sync this with JS
         "working_file_path": actual_working_path,
         "preview_file_path": actual_preview_path,
         "video_width": width,
         "video_height": height,
-        "temp_video_url": settings.MEDIA_URL + actual_original_path  # Start with original
-    })
+        "video_duration": duration,
+        "thumbnails_index_url": thumbnails_index_url,
+        "temp_video_url": settings.MEDIA_URL + actual_original_path,  # Start with original
+        # Immutable URL of the original (its hash is already known), for reset without a re-download
+        "version_url": publish_version(actual_original_path, content_digest),
+    }
+
+
+# --- Resumable chunked video upload (see uploads.py) ---
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def start_video_upload(request):
+    """
+    Starts a resumable upload. POST: filename, size. The chunks then go straight
+    into the new session's original file.
+    """
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Missing or invalid size."}, status=400)
+    if size <= 0 or size > settings.VIDEO_UPLOAD_MAX_BYTES:
+        return JsonResponse({"success": False, "error": "Video is empty or too large."}, status=413)
+
+    name, ext = os.path.splitext(request.POST.get('filename', ''))
+    file_ext = (ext[1:] or 'mp4').lower()
+    try:
+        media_sessions.make_room(request, size)
+    except media_sessions.QuotaExceeded as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=413)
+
+    orig_name, _, _ = generate_stable_file_paths(file_ext)
+    original_path = default_storage.get_available_name(orig_name)
+
+    try:
+        upload_id = uploads.start_upload(original_path, default_storage.path(original_path), size)
+    except redis.RedisError as e:
+        return JsonResponse({"success": False, "error": f"Uploads unavailable: {e}"}, status=503)
+    # The announced size counts against the quota while the chunks arrive
+    media_sessions.register(request, 'video', [original_path], reserved_bytes=size)
+
+    return JsonResponse({"success": True, "upload_id": upload_id, "received": 0})
+
+
+@csrf_exempt
+@require_http_methods(["GET", "PUT"])
+def video_upload_chunk(request, upload_id):
+    """
+    PUT writes one chunk (Content-Range: bytes start-end/total) at the current offset.
+    GET reports how many bytes have arrived, i.e. where to resume.
+    """
+    try:
+        if request.method == 'GET':
+            received = uploads.received_bytes(uploads.get_upload(upload_id))
+        else:
+            received = uploads.write_chunk(upload_id, request, request.headers.get('Content-Range'))
+    except uploads.UploadError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=e.status)
+    except redis.RedisError as e:
+        return JsonResponse({"success": False, "error": f"Uploads unavailable: {e}"}, status=503)
+
+    return JsonResponse({"success": True, "received": received})
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def finalize_video_upload(request, upload_id):
+    """Completes a chunked upload and starts the editing session like initial_video_upload."""
+    try:
+        original_path = uploads.finish_upload(upload_id)
+    except uploads.UploadError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=e.status)
+    except redis.RedisError as e:
+        return JsonResponse({"success": False, "error": f"Uploads unavailable: {e}"}, status=503)
+
+    # The chunks were written to the session's original name; move them into the blob store
+    # (hashing them there) and bring the name back as a clone of the blob
+    file_ext = os.path.splitext(original_path)[1][1:]
+    blob_path, content_digest = blob_store.adopt_file(
+        default_storage.path(original_path), None, file_ext, prepare=_faststart_upload,
+    )
+
+    _, work_name, prev_name = session_paths_for(original_path)
+    return JsonResponse(start_video_session(request, blob_path, original_path, work_name, prev_name, content_digest))
 
 
 # ============================================
@@ -920,9 +1201,9 @@ def generate_ai_image(request):
             # New image uploaded
             uploaded_file = request.FILES['image']
             image_data = uploaded_file.read()
-        elif image_path and default_storage.exists(image_path):
+        elif image_path and get_media_storage().exists(image_path):
             # Use existing image from editor
-            with default_storage.open(image_path, 'rb') as f:
+            with get_media_storage().open(image_path) as f:
                 image_data = f.read()
         else:
             return JsonResponse({"success": False, "error": "No image provided."}, status=400)
@@ -983,7 +1264,8 @@ def generate_ai_image(request):
         ai_image_path = os.path.join(AI_EDITED_IMAGE_DIR, ai_image_filename)
 
         # Save using Django storage
-        saved_path = default_storage.save(ai_image_path, ContentFile(generated_image_data))
+        saved_path = get_media_storage().save_bytes(generated_image_data, ai_image_path)
+        media_gc.touch(saved_path)
 
         # Return success with image URL
         ai_image_url = settings.MEDIA_URL + saved_path